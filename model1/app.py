@@ -3,12 +3,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
-import tensorflow as tf
 import pickle
 from datetime import datetime, timedelta
 import joblib
+import os
+import sys
 from typing import Optional
 
+# Code shared with model2 lives in the weather_common package at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from weather_common.features import LEGACY_FEATURE_COLUMNS
+from weather_common.model_variants import load_weather_model
+
+# Model variant to serve: float32 (original .h5), float16 or int8 (see model2/quantize.py)
+MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'float32')
+
 # Create FastAPI app
 app = FastAPI(
     title="Sri Lanka Weather Prediction API",
@@ -46,10 +55,11 @@ class WeatherPredictionResponse(BaseModel):
     error: Optional[str] = None
 
 class SriLankaWeatherPredictor:
-    def __init__(self, model_path='srilanka_weather_model.h5', preprocess_path='preprocessing_objects.pkl', data_path='Srilanka_weather.csv'):
+    def __init__(self, model_path='srilanka_weather_model.h5', preprocess_path='preprocessing_objects.pkl', data_path='Srilanka_weather.csv', model_variant=None):
+        self.model_variant = model_variant or MODEL_VARIANT
         try:
-            self.model = tf.keras.models.load_model(model_path, compile=False)
-            print("✅ Model loaded successfully")
+            self.model = load_weather_model(model_path, self.model_variant)
+            print(f"✅ Model loaded successfully ({self.model_variant})")
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise e
@@ -218,13 +228,7 @@ class SriLankaWeatherPredictor:
                 note = "Based on historical data"
 
             # Define feature columns
-            feature_columns = [
-                'temperature', 'rain', 'windspeed', 'precipitationHcount',
-                'month', 'day_of_year', 'city_encoded',
-                'temp_roll_7', 'temp_roll_14', 'temp_roll_30',
-                'rain_roll_7', 'rain_roll_14', 'rain_roll_30',
-                'wind_roll_7', 'wind_roll_14', 'wind_roll_30'
-            ]
+            feature_columns = LEGACY_FEATURE_COLUMNS
 
             # Ensure all columns exist
             for col in feature_columns:
@@ -320,6 +324,7 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": predictor.model is not None,
+        "model_variant": predictor.model_variant,
         "cities_loaded": len(predictor.available_cities),
         "timestamp": datetime.now().isoformat()
     }
@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import math
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+# Lower value runs first: interactive /predict and /advice jump ahead of bulk batch chunks
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class PriorityInferenceQueue:
+    """Fixed pool of inference threads fed from a priority queue"""
+
+    def __init__(self, workers=2):
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        # Moving average of job duration, used to estimate Retry-After
+        self.avg_job_seconds = 0.05
+        self.workers = max(1, workers)
+        self._started = False
+
+    def _start_workers(self):
+        """Start the pool on first use, so importing app (e.g. from backtest.py) starts no threads"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True).start()
+
+    @property
+    def depth(self):
+        return self._pending
+
+    def submit(self, priority, fn, *args):
+        """Queue fn(*args) and return an asyncio future for its result"""
+        if not self._started:
+            self._start_workers()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._pending += 1
+        # The sequence number keeps FIFO order within a priority level
+        self._queue.put((priority, next(self._sequence), fn, args, future, loop))
+        return future
+
+    def _worker(self):
+        while True:
+            _, _, fn, args, future, loop = self._queue.get()
+            with self._lock:
+                self._pending -= 1
+
+            # Caller went away (client disconnect) - skip the work
+            if future.cancelled():
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+                loop.call_soon_threadsafe(_set_result, future, result)
+            except Exception as e:
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            self.avg_job_seconds = 0.9 * self.avg_job_seconds + 0.1 * (time.perf_counter() - start)
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost=1):
+        """Take tokens if available, otherwise return seconds until they will be"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate/concurrency limits and queue-depth load shedding"""
+
+    def __init__(self, rate_per_second=10.0, burst=20, max_concurrent_per_client=4,
+                 max_queue_depth=64, workers=2):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_concurrent_per_client = max_concurrent_per_client
+        self.max_queue_depth = max_queue_depth
+        self.queue = PriorityInferenceQueue(workers)
+
+        self._buckets = {}
+        self._active = {}
+        self.stats = {
+            'admitted': 0,
+            'rejected_rate_limit': 0,
+            'rejected_concurrency': 0,
+            'shed_overload': 0,
+        }
+
+    def retry_after(self):
+        """Seconds until the current queue is expected to drain"""
+        backlog = self.queue.depth * self.queue.avg_job_seconds / self.queue.workers
+        return max(1, math.ceil(backlog))
+
+    def check_rate(self, client, cost=1):
+        if self.rate_per_second <= 0:
+            return
+
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            # Drop idle clients so the table doesn't grow without bound
+            if len(self._buckets) > 10000:
+                self._buckets = {k: b for k, b in self._buckets.items() if b.tokens < b.capacity}
+            bucket = self._buckets[client] = TokenBucket(self.rate_per_second, self.burst)
+
+        wait = bucket.take(min(cost, self.burst))
+        if wait:
+            self.stats['rejected_rate_limit'] += 1
+            raise HTTPException(status_code=429, detail="Rate limit exceeded",
+                                headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+    def is_overloaded(self):
+        return self.max_queue_depth > 0 and self.queue.depth >= self.max_queue_depth
+
+    def check_capacity(self):
+        if self.is_overloaded():
+            self.stats['shed_overload'] += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please retry later",
+                                headers={"Retry-After": str(self.retry_after())})
+
+    @asynccontextmanager
+    async def client_slot(self, client, cost=1, check_capacity=True):
+        """Admit one request from a client, or raise 429/503"""
+        self.check_rate(client, cost)
+
+        active = self._active.get(client, 0)
+        if self.max_concurrent_per_client > 0 and active >= self.max_concurrent_per_client:
+            self.stats['rejected_concurrency'] += 1
+            raise HTTPException(status_code=429, detail="Too many concurrent requests",
+                                headers={"Retry-After": "1"})
+
+        if check_capacity:
+            self.check_capacity()
+
+        self._active[client] = active + 1
+        self.stats['admitted'] += 1
+        try:
+            yield
+        finally:
+            remaining = self._active[client] - 1
+            if remaining:
+                self._active[client] = remaining
+            else:
+                del self._active[client]
+
+    async def run(self, priority, fn, *args):
+        """Run blocking inference on the worker pool at the given priority.
+
+        Cancelling the awaiting task cancels the pending job (workers skip it
+        if it hasn't started yet).
+        """
+        return await self.queue.submit(priority, fn, *args)
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'queue_depth': self.queue.depth,
+            'max_queue_depth': self.max_queue_depth,
+            'active_clients': len(self._active),
+            'avg_job_ms': round(self.queue.avg_job_seconds * 1000, 2),
+        }
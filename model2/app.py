@@ -1,14 +1,71 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+import asyncio
 import pandas as pd
 import numpy as np
 import tensorflow as tf
 import pickle
 from datetime import datetime, timedelta
 import joblib
+import os
+import sys
 from typing import Optional
 
+# Code shared with model1 lives in the weather_common package at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from weather_common.features import LEGACY_FEATURE_COLUMNS
+from weather_common.model_variants import load_weather_model
+
+from admission import AdmissionController, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from coalescing import SingleFlight
+from bulk_format import available_formats, bulk_response, negotiate
+from http_cache import cache_headers, cached_json, etag_matches, file_digest, make_etag, not_modified
+from history_index import HistoryIndex
+from prediction_store import PredictionStore
+from sharding import ShardConfig, read_shard_csv
+
+# Model variant to serve: float32 (original .h5), float16 or int8 (see quantize.py),
+# or stub for load testing without the real model (see loadtest.py)
+MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'float32')
+DATA_PATH = os.getenv('DATA_PATH', 'Srilanka_weather.csv')
+
+# Admission control and load shedding (0 disables a limit)
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1000'))
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '32'))
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', '10'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '20'))
+MAX_CONCURRENT_PER_CLIENT = int(os.getenv('MAX_CONCURRENT_PER_CLIENT', '4'))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', '64'))
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '2'))
+
+# Optional per-request latency budget. When the model can't answer in time
+# the API answers from per-city monthly climatology instead (0 = no default budget)
+DEFAULT_LATENCY_BUDGET_MS = int(os.getenv('DEFAULT_LATENCY_BUDGET_MS', '0'))
+RAIN_DAY_THRESHOLD = float(os.getenv('RAIN_DAY_THRESHOLD', '0.1'))
+
+# City sharding: this process only loads the cities it owns (see router.py)
+SHARD = ShardConfig.from_env()
+# Set when running behind router.py so limits apply to the real client
+TRUST_FORWARDED_FOR = os.getenv('TRUST_FORWARDED_FOR', '0') == '1'
+
+# Optional SQLite prediction store shared by all workers (empty = disabled)
+PREDICTION_STORE = os.getenv('PREDICTION_STORE', '')
+PREDICTION_STORE_MAX_ROWS = int(os.getenv('PREDICTION_STORE_MAX_ROWS', '500000'))
+
+# HTTP caching: responses only change with the data or the model, so
+# clients revalidate with ETags after CACHE_MAX_AGE seconds
+CACHE_MAX_AGE = int(os.getenv('CACHE_MAX_AGE', '300'))
+CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}"
+GZIP_MINIMUM_SIZE = int(os.getenv('GZIP_MINIMUM_SIZE', '1024'))
+
+# Batch sizes with a pre-traced, fixed-shape inference function. Inputs are
+# padded up to the nearest bucket so TensorFlow never retraces (empty = plain model.predict)
+INFERENCE_BUCKETS = sorted({int(b) for b in os.getenv('INFERENCE_BUCKETS', '1,8,32,128').split(',') if b.strip()})
+
 # Create FastAPI app
 app = FastAPI(
     title="Sri Lanka Weather Prediction API",
@@ -23,14 +80,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Compress large JSON bodies (batch and all-cities results)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # Global predictor instance
 predictor = None
 
+# Serving counters reported on /metrics
+serving_stats = {
+    'model_predictions': 0,
+    'fallback_deadline': 0,
+    'fallback_overload': 0,
+}
+
+# Inference runs on a priority worker pool behind per-client limits
+admission = AdmissionController(
+    rate_per_second=RATE_LIMIT_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+    max_concurrent_per_client=MAX_CONCURRENT_PER_CLIENT,
+    max_queue_depth=MAX_QUEUE_DEPTH,
+    workers=INFERENCE_WORKERS,
+)
+
+# Identical predictions already in flight are shared instead of recomputed
+singleflight = SingleFlight()
+
+def client_id(http_request: Request):
+    """Identify the caller for rate and concurrency limits"""
+    forwarded = http_request.headers.get('x-forwarded-for')
+    if TRUST_FORWARDED_FOR and forwarded:
+        # Only the rightmost entry was added by the trusted hop; the rest is caller-supplied
+        return forwarded.split(',')[-1].strip()
+    return http_request.client.host if http_request.client else "unknown"
+
+def canonical_date(date):
+    """YYYY-MM-DD form of a date, so "2020-5-1" and "2020-05-01" share cache, store and coalescing keys"""
+    return pd.to_datetime(date).strftime('%Y-%m-%d')
+
+def parse_date_param(date: str):
+    """Validate a request date and return its canonical form"""
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    return canonical_date(date)
+
 class WeatherPredictionRequest(BaseModel):
     city: str
     date: str  # Format: YYYY-MM-DD
+    latency_budget_ms: Optional[int] = None
 
 class WeatherPredictionResponse(BaseModel):
     city: str
@@ -43,13 +144,47 @@ class WeatherPredictionResponse(BaseModel):
     next_month_avg_rainfall: str
     next_month_avg_windspeed: str
     note: str
+    fallback: bool = False
     error: Optional[str] = None
 
+class HistorySummaryRequest(BaseModel):
+    city: str
+    start: str  # Format: YYYY-MM-DD
+    end: str  # Format: YYYY-MM-DD
+
+def match_city(input_city, city_lookup, available_cities):
+    """Find city match case-insensitively with fuzzy matching"""
+    input_city_lower = input_city.lower().strip()
+
+    # Exact match
+    if input_city_lower in city_lookup:
+        return city_lookup[input_city_lower]
+
+    # Partial match
+    partial_matches = []
+    for city in available_cities:
+        if input_city_lower in city.lower():
+            partial_matches.append(city)
+
+    if len(partial_matches) == 1:
+        return partial_matches[0]
+    elif len(partial_matches) > 1:
+        print(f"🔍 Multiple matches found: {partial_matches}")
+        return partial_matches[0]  # Return first match
+
+    return None
+
 class SriLankaWeatherPredictor:
-    def __init__(self, model_path='srilanka_weather_pso_model.h5', preprocess_path='preprocessing_objects.pkl', data_path='Srilanka_weather.csv'):
+    def __init__(self, model_path='srilanka_weather_pso_model.h5', preprocess_path='preprocessing_objects.pkl', data_path='Srilanka_weather.csv', model_variant=None, shard=None, store=None, serving=True):
+        self.model_variant = model_variant or MODEL_VARIANT
+        # Offline tools (backtest.py) only need the model and the data, not the
+        # climatology, resident latest windows or history index
+        self.serving = serving
+        self.shard = shard or SHARD
+        self.store = store
         try:
-            self.model = tf.keras.models.load_model(model_path, compile=False)
-            print("✅ PSO Model loaded successfully")
+            self.model = load_weather_model(model_path, self.model_variant)
+            print(f"✅ PSO Model loaded successfully ({self.model_variant})")
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise e
@@ -58,6 +193,13 @@ class SriLankaWeatherPredictor:
             with open(preprocess_path, 'rb') as f:
                 self.objects = pickle.load(f)
             print("✅ Preprocessing objects loaded successfully")
+
+            # Scalers and feature names change predictions as much as the weights do
+            self.model_version = f"{file_digest(model_path)[:12]}-{file_digest(preprocess_path)[:8]}-{self.model_variant}"
+
+            # model1's preprocessing objects predate feature_names/sequence_length
+            self.feature_columns = self.objects.get('feature_names', LEGACY_FEATURE_COLUMNS)
+            self.sequence_length = self.objects.get('sequence_length', 60)
             
             # Print model info
             if 'model_info' in self.objects:
@@ -69,11 +211,73 @@ class SriLankaWeatherPredictor:
             print(f"❌ Error loading preprocessing objects: {e}")
             raise e
 
-        # Load data
+        self.compile_inference()
+        self.load_data(data_path)
+
+    def compile_inference(self):
+        """Trace one fixed-signature inference function per batch-size bucket and warm each up"""
+        self.buckets = list(INFERENCE_BUCKETS)
+        self._bucket_fns = {}
+        n_features = len(self.feature_columns)
+
+        for bucket in self.buckets:
+            if isinstance(self.model, tf.keras.Model):
+                spec = tf.TensorSpec([bucket, self.sequence_length, n_features], tf.float32)
+                self._bucket_fns[bucket] = tf.function(
+                    lambda x: self.model(x, training=False), input_signature=[spec]
+                )
+            # TFLite variants allocate a dedicated interpreter for this batch size here
+            self.run_bucket(np.zeros((bucket, self.sequence_length, n_features), dtype=np.float32))
+
+        if self.buckets:
+            print(f"🔥 Inference buckets warmed: {', '.join(map(str, self.buckets))}")
+
+    def run_bucket(self, padded):
+        """Run the model on an input whose batch size is exactly one of the buckets"""
+        fn = self._bucket_fns.get(len(padded))
+        if fn is None:
+            return [np.asarray(head) for head in self.model.predict(padded, verbose=0)]
+
+        outputs = fn(tf.constant(padded))
+        if isinstance(outputs, dict):
+            outputs = [outputs[name] for name in self.model.output_names]
+        return [head.numpy() for head in outputs]
+
+    def predict_windows(self, windows):
+        """Model heads for a stack of windows, padded to bucket sizes and trimmed again"""
+        windows = np.asarray(windows, dtype=np.float32)
+        if not self.buckets:
+            return self.model.predict(windows, verbose=0)
+
+        largest = self.buckets[-1]
+        heads = None
+        for offset in range(0, len(windows), largest):
+            chunk = windows[offset:offset + largest]
+            bucket = next(b for b in self.buckets if b >= len(chunk))
+
+            padded = chunk
+            if bucket > len(chunk):
+                padded = np.zeros((bucket,) + chunk.shape[1:], dtype=np.float32)
+                padded[:len(chunk)] = chunk
+
+            outputs = self.run_bucket(padded)
+            if heads is None:
+                heads = [[] for _ in outputs]
+            for head, values in zip(heads, outputs):
+                head.append(values[:len(chunk)])
+
+        if heads is None:
+            return [np.zeros((0, 1), dtype=np.float32) for _ in range(4)]
+        return [np.concatenate(head) for head in heads]
+
+    def load_data(self, data_path):
+        """Load (or reload) the weather data and rebuild everything derived from it"""
         try:
-            self.df = pd.read_csv(data_path)
-            self.df['time'] = pd.to_datetime(self.df['time'])
-            self.df['city_lower'] = self.df['city'].str.lower()
+            df = read_shard_csv(data_path, self.shard)
+            df['time'] = pd.to_datetime(df['time'])
+            df['city_lower'] = df['city'].str.lower()
+            self.df = df
+            self.data_version = file_digest(data_path)[:12]
             print("✅ Data loaded successfully")
         except Exception as e:
             print(f"❌ Error loading data: {e}")
@@ -81,30 +285,106 @@ class SriLankaWeatherPredictor:
 
         # Get available cities
         self.available_cities = sorted(self.df['city'].unique())
+        self.city_lookup = {city.lower(): city for city in reversed(self.df['city'].unique())}
+        self.latest_data_date = self.df['time'].max()
         print(f"📍 Available cities: {len(self.available_cities)} cities loaded")
+        if self.shard.enabled:
+            print(f"🧩 Shard {self.shard.describe()}: {', '.join(self.available_cities)}")
 
-    def find_city_match(self, input_city):
-        """Find city match case-insensitively with fuzzy matching"""
-        input_city_lower = input_city.lower().strip()
+        if not self.serving:
+            return
+
+        self.refresh_climatology()
+        self.refresh_latest_windows()
 
-        # Exact match
-        exact_match = self.df[self.df['city_lower'] == input_city_lower]
-        if len(exact_match) > 0:
-            return exact_match['city'].iloc[0]
+        # Prefix sums and min/max sparse tables for /history/summary
+        self.history = HistoryIndex(self.df)
+        print(f"📚 History index built for {len(self.history.cities)} cities")
+
+    def history_summary(self, city_name, start_date, end_date):
+        """Mean/total/min/max of the daily observations for a city between two dates"""
+        start, end = start_date.isoformat(), end_date.isoformat()
+        actual_city = self.find_city_match(city_name)
+        if actual_city is None:
+            return {'city': city_name, 'start': start, 'end': end, 'error': f"City '{city_name}' not found"}
+
+        summary = self.history.summary(actual_city, np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D'))
+        if summary is None:
+            return {'city': actual_city, 'start': start, 'end': end, 'error': "No data in this date range"}
+        return {'city': actual_city, 'start': start, 'end': end, **summary}
+
+    def refresh_climatology(self):
+        """Precompute per-city monthly means (and rainy-day frequency) from the data"""
+        grouped = self.df.assign(
+            month=self.df['time'].dt.month,
+            rain_day=(self.df['rain'] > RAIN_DAY_THRESHOLD).astype(float)
+        ).groupby(['city', 'month'])
+        means = grouped[['temperature', 'rain', 'windspeed', 'rain_day']].mean()
+        self.climatology = {key: row._asdict() for key, row in zip(means.index, means.itertuples(index=False))}
+
+    def climatology_values(self, city_name, date, reason):
+        """Fallback prediction from monthly climatology, in the same shape as predict_values"""
+        actual_city = self.find_city_match(city_name)
+        if actual_city is None:
+            return {'error': f"City '{city_name}' not found"}
 
-        # Partial match
-        partial_matches = []
+        input_date = pd.to_datetime(date)
+        month_stats = self.climatology.get((actual_city, input_date.month))
+        if month_stats is None:
+            return {'error': "No historical data for this month"}
+
+        # The averaged heads cover the next 30 days, so weight each month by
+        # how many of those days fall in it
+        next_days = pd.date_range(input_date + timedelta(days=1), periods=30, freq='D')
+        weighted = {'temperature': 0.0, 'rain': 0.0, 'windspeed': 0.0}
+        total_days = 0
+        for month, days in next_days.month.value_counts().items():
+            stats = self.climatology.get((actual_city, month))
+            if stats is None:
+                continue
+            for name in weighted:
+                weighted[name] += stats[name] * days
+            total_days += days
+        if total_days == 0:
+            return {'error': "No historical data for the coming month"}
+
+        outputs = {
+            # Tomorrow's rain chance comes from the current month
+            'rain_probability': [month_stats['rain_day']],
+            'temperature': [np.clip(weighted['temperature'] / total_days, 18, 35)],
+            'rainfall': [np.clip(weighted['rain'] / total_days, 0, 100)],
+            'windspeed': [np.clip(weighted['windspeed'] / total_days, 5, 25)],
+        }
+        values = self.prediction_values(actual_city, date, outputs, 0, f"Climatology fallback - {reason}")
+        values['fallback'] = True
+        return values
+
+    def cache_key(self, *parts):
+        """ETag for a response that depends only on the data, the model and the given parts"""
+        return make_etag(self.data_version, self.model_version, *parts)
+
+    def refresh_latest_windows(self):
+        """Keep every city's most recent scaled window resident as one (n_cities, seq, features) array"""
+        cities, dates, windows = [], [], []
         for city in self.available_cities:
-            if input_city_lower in city.lower():
-                partial_matches.append(city)
+            city_date = self.df.loc[self.df['city'] == city, 'time'].max().strftime('%Y-%m-%d')
+            window, _, error = self.build_window(city, city_date)
+            if error:
+                continue
+            cities.append(city)
+            dates.append(city_date)
+            windows.append(window)
 
-        if len(partial_matches) == 1:
-            return partial_matches[0]
-        elif len(partial_matches) > 1:
-            print(f"🔍 Multiple matches found: {partial_matches}")
-            return partial_matches[0]  # Return first match
+        shape = (0, self.sequence_length, len(self.feature_columns))
+        stacked = np.stack(windows) if windows else np.zeros(shape, dtype=np.float32)
 
-        return None
+        # Swap in one assignment so concurrent readers never see a partial update
+        self.latest_windows = (cities, dates, stacked)
+        print(f"🗺️ Latest windows ready for {len(cities)} cities")
+
+    def find_city_match(self, input_city):
+        """Find city match case-insensitively with fuzzy matching"""
+        return match_city(input_city, self.city_lookup, self.available_cities)
 
     def create_synthetic_future_data(self, city_name, future_date):
         """Create synthetic data for future predictions based on historical patterns"""
@@ -118,9 +398,9 @@ class SriLankaWeatherPredictor:
             return None, "City not found"
 
         # Get historical patterns for the same month
-        historical_month_data = city_data[city_data['time'].dt.month == month]
+        month_stats = self.climatology.get((city_name, month))
 
-        if len(historical_month_data) == 0:
+        if month_stats is None:
             return None, "No historical data for this month"
 
         # Use the most recent 60 days available as base
@@ -133,9 +413,9 @@ class SriLankaWeatherPredictor:
         synthetic_data = latest_data.copy()
 
         # Adjust for seasonal patterns based on historical averages for that month
-        monthly_avg_temp = historical_month_data['temperature'].mean()
-        monthly_avg_rain = historical_month_data['rain'].mean()
-        monthly_avg_wind = historical_month_data['windspeed'].mean()
+        monthly_avg_temp = month_stats['temperature']
+        monthly_avg_rain = month_stats['rain']
+        monthly_avg_wind = month_stats['windspeed']
 
         current_avg_temp = latest_data['temperature'].mean()
         current_avg_rain = latest_data['rain'].mean()
@@ -187,7 +467,8 @@ class SriLankaWeatherPredictor:
 
         return data
 
-    def get_sri_lanka_season(self, month):
+    @staticmethod
+    def get_sri_lanka_season(month):
         """Get Sri Lanka season based on month"""
         if month in [12, 1, 2]:
             return "Northeast Monsoon Season"
@@ -200,6 +481,13 @@ class SriLankaWeatherPredictor:
 
     def predict_weather(self, city_name, date):
         """Main prediction function that works for both past and future dates"""
+        values = self.predict_values(city_name, date)
+        if 'error' in values:
+            return values
+        return self.format_prediction(values)
+
+    def predict_values(self, city_name, date):
+        """Predict one city and date, returning raw numeric values instead of display strings"""
         print(f"\n🔮 Predicting weather for '{city_name}' on {date}...")
 
         # Find actual city name
@@ -209,97 +497,199 @@ class SriLankaWeatherPredictor:
             return {'error': f"City '{city_name}' not found. Try: {', '.join(available_sample)}"}
 
         print(f"📍 Using city: {actual_city}")
+        date = canonical_date(date)
+
+        if self.store is not None:
+            stored = self.store.get(actual_city, date, self.model_version, self.data_version)
+            if stored is not None:
+                return stored
 
         # Check if date is in future
+        if pd.to_datetime(date) > self.latest_data_date:
+            print("📅 Future date detected - using seasonal patterns...")
+        else:
+            print("📅 Historical date detected - using actual data...")
+
+        scaled_features, note, error = self.build_window(actual_city, date)
+        if error:
+            return {'error': error}
+
+        # Make prediction
+        try:
+            predictions = self.predict_windows(scaled_features[np.newaxis])
+            outputs = self.decode_outputs(predictions)
+            values = self.prediction_values(actual_city, date, outputs, 0, note)
+        except Exception as e:
+            return {'error': f"Prediction failed: {str(e)}"}
+
+        # Outside the try: a store failure must never fail a prediction
+        if self.store is not None:
+            self.store.put(actual_city, date, self.model_version, self.data_version, values)
+        return values
+
+    def predict_all_cities(self):
+        """Tomorrow's weather for every city from the resident latest windows in one forward pass"""
+        cities, dates, windows = self.latest_windows
+        if len(cities) == 0:
+            return []
+
+        try:
+            predictions = self.predict_windows(windows)
+            outputs = self.decode_outputs(predictions)
+        except Exception as e:
+            return [{'city': city, 'date': date, 'error': f"Prediction failed: {str(e)}"}
+                    for city, date in zip(cities, dates)]
+
+        return [self.prediction_values(city, date, outputs, i, "Based on historical data")
+                for i, (city, date) in enumerate(zip(cities, dates))]
+
+    def predict_values_many(self, requests):
+        """Predict a list of (city, date) pairs with one bucketed forward pass"""
+        results = [None] * len(requests)
+        rows, windows, notes = [], [], []
+        for i, (city_name, date) in enumerate(requests):
+            actual_city = self.find_city_match(city_name)
+            if actual_city is None:
+                available_sample = self.available_cities[:8]
+                results[i] = {'error': f"City '{city_name}' not found. Try: {', '.join(available_sample)}"}
+                continue
+            date = canonical_date(date)
+
+            if self.store is not None:
+                stored = self.store.get(actual_city, date, self.model_version, self.data_version)
+                if stored is not None:
+                    results[i] = stored
+                    continue
+
+            window, note, error = self.build_window(actual_city, date)
+            if error:
+                results[i] = {'error': error}
+                continue
+            rows.append((i, actual_city, date))
+            windows.append(window)
+            notes.append(note)
+
+        if windows:
+            try:
+                outputs = self.decode_outputs(self.predict_windows(np.stack(windows)))
+                for row, ((i, actual_city, date), note) in enumerate(zip(rows, notes)):
+                    results[i] = self.prediction_values(actual_city, date, outputs, row, note)
+            except Exception as e:
+                for i, _, _ in rows:
+                    results[i] = {'error': f"Prediction failed: {str(e)}"}
+                return results
+
+            if self.store is not None:
+                self.store.put_many([(actual_city, date, self.model_version, self.data_version, results[i])
+                                     for i, actual_city, date in rows])
+
+        return results
+
+    def prediction_values(self, city, date, outputs, row, note):
+        """Raw values for one row of decoded model outputs, in the units the API reports"""
+        return {
+            'city': city,
+            'date': date,
+            'rain_probability': float(outputs['rain_probability'][row]),
+            'temperature': float(outputs['temperature'][row]),
+            'rainfall': float(outputs['rainfall'][row]) * 80,
+            'windspeed': float(outputs['windspeed'][row]),
+            'note': note
+        }
+
+    def format_prediction(self, values):
+        """Build the API response from raw prediction values"""
+        rain_prob = values['rain_probability']
+        date = values['date']
+
+        # Determine weather
+        tomorrow_weather = "Rainy" if rain_prob > 0.65 else "Not Rainy"
+        confidence = "High" if (rain_prob > 0.75 or rain_prob < 0.3) else "Medium"
+
+        # Get seasonal context
+        season = self.get_sri_lanka_season(pd.to_datetime(date).month)
+
+        return {
+            'city': values['city'],
+            'date': date,
+            'season': season,
+            'tomorrow_weather': tomorrow_weather,
+            'rain_probability': f"{rain_prob*100:.1f}%",
+            'confidence': confidence,
+            'next_month_avg_temperature': f"{values['temperature']:.1f}°C",
+            'next_month_avg_rainfall': f"{values['rainfall']:.1f} mm",
+            'next_month_avg_windspeed': f"{values['windspeed']:.1f} km/h",
+            'note': values['note'],
+            'fallback': values.get('fallback', False)
+        }
+
+    def format_results(self, results):
+        """Format a list of raw values, passing error entries through unchanged"""
+        return [result if 'error' in result else self.format_prediction(result) for result in results]
+
+    def build_window(self, actual_city, date):
+        """Build the scaled (sequence_length, n_features) model input for a resolved city and date"""
         input_date = pd.to_datetime(date)
-        latest_data_date = self.df['time'].max()
 
-        if input_date > latest_data_date:
-            print("📅 Future date detected - using seasonal patterns...")
+        if input_date > self.latest_data_date:
             # Use synthetic data for future dates
             synthetic_data, error = self.create_synthetic_future_data(actual_city, date)
             if error:
-                return {'error': error}
+                return None, None, error
             features_data = self.prepare_features(synthetic_data, actual_city)
             note = "Based on historical seasonal patterns"
         else:
-            print("📅 Historical date detected - using actual data...")
             # Use actual historical data
             city_data = self.df[self.df['city'] == actual_city].copy()
-            city_data = city_data[city_data['time'] <= input_date].tail(60)
+            city_data = city_data[city_data['time'] <= input_date].tail(self.sequence_length)
 
-            if len(city_data) < 60:
-                return {'error': f"Not enough data for {actual_city}. Need 60 days, have {len(city_data)}"}
+            if len(city_data) < self.sequence_length:
+                return None, None, f"Not enough data for {actual_city}. Need {self.sequence_length} days, have {len(city_data)}"
 
             features_data = self.prepare_features(city_data, actual_city)
             note = "Based on historical data"
 
-        # Get feature names from preprocessing objects
-        feature_columns = self.objects['feature_names']
-
         # Ensure all columns exist
-        for col in feature_columns:
+        for col in self.feature_columns:
             if col not in features_data.columns:
                 features_data[col] = 0
 
-        feature_values = features_data[feature_columns].values
+        feature_values = features_data[self.feature_columns].values
 
         # Scale features
         scaled_features = self.objects['scaler'].transform(feature_values)
-        scaled_features = scaled_features.reshape(1, self.objects['sequence_length'], len(feature_columns))
+        return scaled_features.astype(np.float32), note, None
 
-        # Make prediction
-        try:
-            predictions = self.model.predict(scaled_features, verbose=0)
-
-            # Process predictions
-            rain_prob = float(predictions[0][0][0])
-            temp_pred = float(predictions[1][0][0])
-            rain_pred = float(predictions[2][0][0])
-            wind_pred = float(predictions[3][0][0])
-
-            # Apply inverse scaling
-            try:
-                temp_pred = self.objects['temp_scaler'].inverse_transform([[temp_pred]])[0][0]
-                rain_pred = self.objects['rain_scaler'].inverse_transform([[rain_pred]])[0][0]
-                wind_pred = self.objects['wind_scaler'].inverse_transform([[wind_pred]])[0][0]
-            except Exception as e:
-                print(f"⚠️ Scaling warning: {e}")
-
-            # Apply constraints
-            temp_pred = np.clip(temp_pred, 18, 35)
-            rain_pred = np.clip(rain_pred, 0, 100)
-            wind_pred = np.clip(wind_pred, 5, 25)
-
-            # Determine weather
-            tomorrow_weather = "Rainy" if rain_prob > 0.65 else "Not Rainy"
-            confidence = "High" if (rain_prob > 0.75 or rain_prob < 0.3) else "Medium"
-
-            # Get seasonal context
-            season = self.get_sri_lanka_season(pd.to_datetime(date).month)
-
-            return {
-                'city': actual_city,
-                'date': date,
-                'season': season,
-                'tomorrow_weather': tomorrow_weather,
-                'rain_probability': f"{rain_prob*100:.1f}%",
-                'confidence': confidence,
-                'next_month_avg_temperature': f"{temp_pred:.1f}°C",
-                'next_month_avg_rainfall': f"{rain_pred*80:.1f} mm",
-                'next_month_avg_windspeed': f"{wind_pred:.1f} km/h",
-                'note': note
-            }
+    def decode_outputs(self, predictions):
+        """Turn raw model heads into inverse-scaled, constrained arrays (one value per row)"""
+        rain_prob = np.asarray(predictions[0], dtype=np.float64).reshape(-1)
+        temp_pred = np.asarray(predictions[1], dtype=np.float64).reshape(-1, 1)
+        rain_pred = np.asarray(predictions[2], dtype=np.float64).reshape(-1, 1)
+        wind_pred = np.asarray(predictions[3], dtype=np.float64).reshape(-1, 1)
 
+        # Apply inverse scaling
+        try:
+            temp_pred = self.objects['temp_scaler'].inverse_transform(temp_pred)
+            rain_pred = self.objects['rain_scaler'].inverse_transform(rain_pred)
+            wind_pred = self.objects['wind_scaler'].inverse_transform(wind_pred)
         except Exception as e:
-            return {'error': f"Prediction failed: {str(e)}"}
+            print(f"⚠️ Scaling warning: {e}")
+
+        # Apply constraints
+        return {
+            'rain_probability': rain_prob,
+            'temperature': np.clip(temp_pred.reshape(-1), 18, 35),
+            'rainfall': np.clip(rain_pred.reshape(-1), 0, 100),
+            'windspeed': np.clip(wind_pred.reshape(-1), 5, 25),
+        }
 
 # Startup event - initialize the predictor
 @app.on_event("startup")
 async def startup_event():
     global predictor
     try:
-        predictor = SriLankaWeatherPredictor()
+        store = PredictionStore(PREDICTION_STORE, PREDICTION_STORE_MAX_ROWS) if PREDICTION_STORE else None
+        predictor = SriLankaWeatherPredictor(data_path=DATA_PATH, store=store)
         print("🚀 Sri Lanka Weather Prediction API started successfully!")
         print(f"📍 {len(predictor.available_cities)} cities available for predictions")
         
@@ -331,7 +721,11 @@ async def root():
             "cities": "/cities", 
             "predict": "/predict",
             "advice": "/advice",
-            "batch_predict": "/predict/batch"
+            "batch_predict": "/predict/batch",
+            "all_cities": "/predict/all-cities",
+            "history_summary": "/history/summary",
+            "bulk_formats": available_formats(),
+            "metrics": "/metrics"
         }
     }
 
@@ -347,83 +741,253 @@ async def health_check():
         "status": "healthy",
         "model_loaded": predictor.model is not None,
         "model_type": pso_status,
+        "model_variant": predictor.model_variant,
         "cities_loaded": len(predictor.available_cities),
+        "shard": predictor.shard.describe() if predictor.shard.enabled else None,
+        "trust_forwarded_for": TRUST_FORWARDED_FOR,
         "timestamp": datetime.now().isoformat()
     }
 
 # Get available cities endpoint
 @app.get("/cities")
-async def get_cities():
+async def get_cities(http_request: Request):
     if predictor is None:
         raise HTTPException(status_code=500, detail="Predictor not initialized")
     
-    return {
+    etag = make_etag(predictor.data_version, "cities")
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    
+    return cached_json({
         "available_cities": predictor.available_cities,
         "total_cities": len(predictor.available_cities)
-    }
+    }, etag, CACHE_CONTROL)
 
 # Main prediction endpoint
-@app.post("/predict", response_model=WeatherPredictionResponse)
-async def predict_weather(request: WeatherPredictionRequest):
-    if predictor is None:
-        raise HTTPException(status_code=500, detail="Predictor not initialized")
-    
+async def run_prediction(city: str, date: str, http_request: Request, latency_budget_ms: Optional[int] = None):
+    """Validate and run one interactive prediction, falling back to climatology past the latency budget"""
     # Validate date format
-    try:
-        datetime.strptime(request.date, '%Y-%m-%d')
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    date = parse_date_param(date)
     
     # Validate city
-    if not request.city or not request.city.strip():
+    if not city or not city.strip():
         raise HTTPException(status_code=400, detail="City name cannot be empty")
     
+    # Budget from the request, then the X-Latency-Budget-Ms header, then the server default
+    budget_ms = latency_budget_ms or http_request.headers.get('x-latency-budget-ms') or DEFAULT_LATENCY_BUDGET_MS
+    try:
+        budget_ms = int(budget_ms)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid latency budget")
+    
+    # Time spent queueing counts against the budget too
+    timeout = budget_ms / 1000 if budget_ms > 0 else None
+    
+    # Canonical key so "colombo", " Colombo" and "Colo" share one inference
+    actual_city = predictor.find_city_match(city) or city.lower().strip()
+    key = ("predict", actual_city, date, predictor.model_version, predictor.data_version)
+    
     # Make prediction
-    result = predictor.predict_weather(request.city, request.date)
+    try:
+        # Joining an in-flight prediction adds no queue load, so skip the capacity check
+        async with admission.client_slot(client_id(http_request), check_capacity=not singleflight.in_flight(key)):
+            result = await singleflight.do(
+                key,
+                lambda: admission.run(PRIORITY_INTERACTIVE, predictor.predict_weather, city, date),
+                timeout=timeout
+            )
+        if 'error' not in result:
+            serving_stats['model_predictions'] += 1
+    except asyncio.TimeoutError:
+        serving_stats['fallback_deadline'] += 1
+        result = climatology_fallback(city, date, "model did not respond within the latency budget")
+    except HTTPException as e:
+        # A caller with a budget prefers an estimate over a 503
+        if e.status_code != 503 or timeout is None:
+            raise
+        serving_stats['fallback_overload'] += 1
+        result = climatology_fallback(city, date, "model is overloaded")
     
     if 'error' in result:
         raise HTTPException(status_code=400, detail=result['error'])
     
+    return result
+
+def climatology_fallback(city: str, date: str, reason: str):
+    values = predictor.climatology_values(city, date, reason)
+    if 'error' in values:
+        raise HTTPException(status_code=504, detail=f"Prediction not available ({reason}): {values['error']}")
+    return predictor.format_prediction(values)
+
+def response_cache_headers(result, etag):
+    """Fallback answers must not be stored under the model's ETag"""
+    if result.get('fallback'):
+        return {"Cache-Control": "no-store"}
+    return cache_headers(etag, CACHE_CONTROL)
+
+@app.post("/predict", response_model=WeatherPredictionResponse)
+async def predict_weather(request: WeatherPredictionRequest, http_request: Request):
+    if predictor is None:
+        raise HTTPException(status_code=500, detail="Predictor not initialized")
+    
+    result = await run_prediction(request.city, request.date, http_request, request.latency_budget_ms)
     return WeatherPredictionResponse(**result)
 
-# Batch prediction endpoint
-@app.post("/predict/batch")
-async def predict_weather_batch(requests: list[WeatherPredictionRequest]):
+# Cacheable prediction endpoint - same result as POST /predict, with ETag revalidation
+@app.get("/predict", response_model=WeatherPredictionResponse)
+async def get_prediction(city: str, date: str, http_request: Request, latency_budget_ms: Optional[int] = None):
     if predictor is None:
         raise HTTPException(status_code=500, detail="Predictor not initialized")
     
-    results = []
-    for request in requests:
+    # Predictions are deterministic for a given data and model version
+    etag = predictor.cache_key("predict", city.lower().strip(), parse_date_param(date))
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    
+    result = await run_prediction(city, date, http_request, latency_budget_ms)
+    return JSONResponse(content=jsonable_encoder(WeatherPredictionResponse(**result)),
+                        headers=response_cache_headers(result, etag))
+
+# Batch prediction endpoint
+def predict_batch_chunk(requests):
+    """Predict one chunk of a batch on an inference worker"""
+    results = [None] * len(requests)
+    valid = []
+    for i, request in enumerate(requests):
         # Validate date format
         try:
             datetime.strptime(request.date, '%Y-%m-%d')
         except ValueError:
-            results.append({
+            results[i] = {
                 'city': request.city,
                 'date': request.date,
                 'error': "Invalid date format. Use YYYY-MM-DD"
-            })
+            }
             continue
-        
-        # Make prediction
-        result = predictor.predict_weather(request.city, request.date)
-        results.append(result)
+        valid.append(i)
     
-    return {
-        "predictions": results,
+    # Make predictions for the whole chunk in one forward pass
+    predictions = predictor.predict_values_many([(requests[i].city, requests[i].date) for i in valid])
+    for i, result in zip(valid, predictions):
+        results[i] = result
+    return results
+
+@app.post("/predict/batch")
+async def predict_weather_batch(requests: list[WeatherPredictionRequest], http_request: Request):
+    if predictor is None:
+        raise HTTPException(status_code=500, detail="Predictor not initialized")
+    
+    if MAX_BATCH_SIZE > 0 and len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Maximum is {MAX_BATCH_SIZE} predictions")
+    
+    # Run the batch in chunks at bulk priority so interactive requests
+    # can be scheduled in between
+    results = []
+    chunk_size = max(1, BATCH_CHUNK_SIZE)
+    async with admission.client_slot(client_id(http_request)):
+        for start in range(0, len(requests), chunk_size):
+            chunk = requests[start:start + chunk_size]
+            results.extend(await admission.run(PRIORITY_BULK, predict_batch_chunk, chunk))
+    
+    # Bulk clients can ask for columnar binary instead of JSON
+    media_type = negotiate(http_request.headers.get('accept'))
+    if media_type:
+        return bulk_response(results, media_type, headers={"Vary": "Accept"})
+    
+    return JSONResponse(content={
+        "predictions": predictor.format_results(results),
+        "total_predictions": len(results)
+    }, headers={"Vary": "Accept"})
+
+# Nowcast for every city in a single forward pass
+@app.get("/predict/all-cities")
+async def predict_all_cities(http_request: Request):
+    if predictor is None:
+        raise HTTPException(status_code=500, detail="Predictor not initialized")
+    
+    media_type = negotiate(http_request.headers.get('accept'))
+    etag = predictor.cache_key("all-cities", media_type or "json")
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL, vary="Accept")
+    
+    key = ("all-cities", predictor.model_version, predictor.data_version)
+    async with admission.client_slot(client_id(http_request), check_capacity=not singleflight.in_flight(key)):
+        results = await singleflight.do(key, lambda: admission.run(PRIORITY_INTERACTIVE, predictor.predict_all_cities))
+    
+    if media_type:
+        return bulk_response(results, media_type, headers=cache_headers(etag, CACHE_CONTROL, vary="Accept"))
+    
+    return cached_json({
+        "predictions": predictor.format_results(results),
         "total_predictions": len(results)
+    }, etag, CACHE_CONTROL, vary="Accept")
+
+def validate_range(start: str, end: str):
+    """Parse a date range into (start_date, end_date, error)"""
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, "Invalid date format. Use YYYY-MM-DD"
+    if start_date > end_date:
+        return None, None, "start must not be after end"
+    return start_date, end_date, None
+
+# Historical aggregates for a city and date range
+@app.get("/history/summary")
+async def get_history_summary(city: str, start: str, end: str, http_request: Request):
+    if predictor is None:
+        raise HTTPException(status_code=500, detail="Predictor not initialized")
+    
+    start_date, end_date, error = validate_range(start, end)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    etag = make_etag(predictor.data_version, "history", city.lower().strip(),
+                     start_date.isoformat(), end_date.isoformat())
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    
+    # Constant-time lookups, cheap enough to answer without the inference queue
+    result = predictor.history_summary(city, start_date, end_date)
+    if 'error' in result:
+        raise HTTPException(status_code=400, detail=result['error'])
+    
+    return cached_json(result, etag, CACHE_CONTROL)
+
+@app.post("/history/summary/batch")
+async def get_history_summary_batch(requests: list[HistorySummaryRequest]):
+    if predictor is None:
+        raise HTTPException(status_code=500, detail="Predictor not initialized")
+    
+    if MAX_BATCH_SIZE > 0 and len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Maximum is {MAX_BATCH_SIZE} queries")
+    
+    results = []
+    for request in requests:
+        start_date, end_date, error = validate_range(request.start, request.end)
+        if error:
+            results.append({'city': request.city, 'start': request.start, 'end': request.end, 'error': error})
+            continue
+        results.append(predictor.history_summary(request.city, start_date, end_date))
+    
+    return {
+        "summaries": results,
+        "total_summaries": len(results)
     }
 
 # Get farming advice endpoint
 @app.get("/advice")
-async def get_farming_advice(city: str, date: str):
+async def get_farming_advice(city: str, date: str, http_request: Request, latency_budget_ms: Optional[int] = None):
     if predictor is None:
         raise HTTPException(status_code=500, detail="Predictor not initialized")
     
+    etag = predictor.cache_key("advice", city.lower().strip(), parse_date_param(date))
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    
     # Make prediction first
-    result = predictor.predict_weather(city, date) 
-    if 'error' in result:
-        raise HTTPException(status_code=400, detail=result['error'])
+    result = await run_prediction(city, date, http_request, latency_budget_ms)
     
     # Generate farming advice based on predictions
     rain_amount = float(result['next_month_avg_rainfall'].split()[0])
@@ -432,6 +996,7 @@ async def get_farming_advice(city: str, date: str):
     advice = {
         "city": result['city'],
         "date": result['date'],
+        "fallback": result['fallback'],
         "tomorrow_weather": result['tomorrow_weather'],
         "next_month_forecast": {
             "temperature": result['next_month_avg_temperature'],
@@ -489,16 +1054,22 @@ async def get_farming_advice(city: str, date: str):
             "Perfect for drying crops"
         ])
     
-    return advice
+    return JSONResponse(content=advice, headers=response_cache_headers(result, etag))
 
 # Model info endpoint
 @app.get("/model-info")
-async def get_model_info():
+async def get_model_info(http_request: Request):
     if predictor is None:
         raise HTTPException(status_code=500, detail="Predictor not initialized")
     
+    etag = make_etag(predictor.model_version, "model-info")
+    if etag_matches(http_request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    
     info = {
         "model_type": "LSTM with PSO Optimization",
+        "model_variant": predictor.model_variant,
+        "model_version": predictor.model_version,
         "features_used": predictor.objects.get('feature_names', []),
         "sequence_length": predictor.objects.get('sequence_length', 60),
         "prediction_targets": ["rain_probability", "temperature", "rainfall", "windspeed"]
@@ -510,7 +1081,28 @@ async def get_model_info():
     if 'pso_parameters' in predictor.objects:
         info['pso_optimization'] = predictor.objects['pso_parameters']
     
-    return info
+    return cached_json(info, etag, CACHE_CONTROL)
+
+# Admission control metrics endpoint
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "serving": serving_stats,
+        "admission": admission.snapshot(),
+        "coalescing": singleflight.snapshot(),
+        "prediction_store": predictor.store.snapshot() if predictor is not None and predictor.store is not None else None,
+        "limits": {
+            "max_batch_size": MAX_BATCH_SIZE,
+            "batch_chunk_size": BATCH_CHUNK_SIZE,
+            "rate_limit_per_second": RATE_LIMIT_PER_SECOND,
+            "rate_limit_burst": RATE_LIMIT_BURST,
+            "max_concurrent_per_client": MAX_CONCURRENT_PER_CLIENT,
+            "max_queue_depth": MAX_QUEUE_DEPTH,
+            "inference_workers": INFERENCE_WORKERS,
+            "default_latency_budget_ms": DEFAULT_LATENCY_BUDGET_MS,
+            "inference_buckets": INFERENCE_BUCKETS
+        }
+    }
 
 if __name__ == "__main__":
     import uvicorn
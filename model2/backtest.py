@@ -0,0 +1,329 @@
+"""Backtest the weather models against the full history.
+
+Every (city, day) with 60 days of history behind it and 30 days of
+observations after it becomes one window. Windows are built per city with
+vectorized numpy (no per-date pandas slicing), scored in large batches on a
+process pool, and compared with the observed next-day rain and the observed
+averages over the following 30 days.
+
+    python backtest.py                           # both models, all cores
+    python backtest.py --models model2 --workers 4 --variant int8
+    python backtest.py --cities Colombo Kandy --output backtest_colombo.json
+
+The report has overall, per-city and per-season error metrics plus
+throughput figures.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import INFERENCE_BUCKETS, SriLankaWeatherPredictor, match_city
+from quantize import BASE_DIR, MODELS
+
+# Days after the window end used for the next-month averages
+HORIZON_DAYS = 30
+RAINY_THRESHOLD = 0.65
+ROLL_WINDOWS = [7, 14, 30]
+
+# Set once per worker process by init_worker
+_predictor = None
+_city_cache = {}
+
+
+def init_worker(model_path, preprocess_path, data_path, variant, threads):
+    """Load the model and data once per worker process"""
+    global _predictor
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _predictor = SriLankaWeatherPredictor(model_path, preprocess_path, data_path, model_variant=variant,
+                                          serving=False)
+
+
+def in_window_rolling_mean(windows, size):
+    """rolling(size, min_periods=1).mean() applied inside every window, vectorized.
+
+    Like pandas, NaNs are skipped and a span with no values gives NaN.
+    """
+    n, length = windows.shape
+    valid = ~np.isnan(windows)
+    csum = np.zeros((n, length + 1))
+    counts = np.zeros((n, length + 1))
+    np.cumsum(np.where(valid, windows, 0.0), axis=1, out=csum[:, 1:])
+    np.cumsum(valid, axis=1, dtype=np.float64, out=counts[:, 1:])
+    positions = np.arange(length)
+    starts = np.maximum(0, positions - size + 1)
+    span_counts = counts[:, positions + 1] - counts[:, starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(span_counts > 0, (csum[:, positions + 1] - csum[:, starts]) / span_counts, np.nan)
+
+
+def fill_in_window(windows):
+    """bfill() then ffill() along every window, vectorized"""
+    rows = np.arange(windows.shape[0])[:, None]
+    positions = np.arange(windows.shape[1])
+    valid = ~np.isnan(windows)
+
+    # Next valid position at or after each slot (bfill)
+    nxt = np.where(valid, positions, windows.shape[1])
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    filled = np.where(nxt < windows.shape[1], windows[rows, np.minimum(nxt, windows.shape[1] - 1)], np.nan)
+
+    # Previous valid position at or before each slot (ffill)
+    valid = ~np.isnan(filled)
+    prev = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    return np.where(prev >= 0, filled[rows, np.maximum(prev, 0)], np.nan)
+
+
+def city_series(predictor, city):
+    """One city's sorted history, raw and gap-filled.
+
+    Model inputs are built from the raw series and filled per window, as
+    prepare_features does; the filled copy is only used for observed targets.
+    """
+    city_data = predictor.df[predictor.df['city'] == city].sort_values('time').reset_index(drop=True)
+    return city_data, city_data.bfill().ffill()
+
+
+def build_city_windows(predictor, city_data, city, ends):
+    """Scaled model inputs for windows ending at the given row positions.
+
+    Mirrors prepare_features + build_window for historical dates: constraints,
+    calendar features and NaN-skipping rolling means computed inside each
+    60-day window, then bfill/ffill within the window.
+    """
+    seq = predictor.sequence_length
+    index = ends[:, None] + np.arange(-seq + 1, 1)[None, :]
+
+    temperature = city_data['temperature'].clip(18, 35).to_numpy(dtype=np.float64)[index]
+    rain = city_data['rain'].clip(0, 100).to_numpy(dtype=np.float64)[index]
+    windspeed = city_data['windspeed'].clip(5, 25).to_numpy(dtype=np.float64)[index]
+
+    try:
+        city_encoded = predictor.objects['city_encoder'].transform([city])[0]
+    except Exception:
+        city_encoded = 0
+
+    computed = {
+        'temperature': temperature,
+        'rain': rain,
+        'windspeed': windspeed,
+        'month': city_data['time'].dt.month.to_numpy()[index],
+        'day_of_year': city_data['time'].dt.dayofyear.to_numpy()[index],
+        'city_encoded': np.full(index.shape, city_encoded, dtype=np.float64),
+    }
+    for size in ROLL_WINDOWS:
+        computed[f'temp_roll_{size}'] = in_window_rolling_mean(temperature, size)
+        computed[f'rain_roll_{size}'] = in_window_rolling_mean(rain, size)
+        computed[f'wind_roll_{size}'] = in_window_rolling_mean(windspeed, size)
+
+    features = np.zeros(index.shape + (len(predictor.feature_columns),), dtype=np.float64)
+    for i, col in enumerate(predictor.feature_columns):
+        if col in computed:
+            features[:, :, i] = fill_in_window(computed[col])
+        elif col in city_data.columns:
+            values = pd.to_numeric(city_data[col], errors='coerce').to_numpy(dtype=np.float64)[index]
+            features[:, :, i] = fill_in_window(values)
+
+    flat = predictor.objects['scaler'].transform(features.reshape(-1, features.shape[-1]))
+    return flat.reshape(features.shape).astype(np.float32)
+
+
+def observed_targets(city_data, ends, rain_threshold):
+    """Observed next-day rain and averages over the following HORIZON_DAYS days"""
+    horizon = ends[:, None] + np.arange(1, HORIZON_DAYS + 1)[None, :]
+    rain = city_data['rain'].to_numpy(dtype=np.float64)
+    return {
+        'rained_next_day': (rain[ends + 1] > rain_threshold).astype(np.float64),
+        'temperature': city_data['temperature'].to_numpy(dtype=np.float64)[horizon].mean(axis=1),
+        'rainfall': rain[horizon].mean(axis=1),
+        'windspeed': city_data['windspeed'].to_numpy(dtype=np.float64)[horizon].mean(axis=1),
+    }
+
+
+def score_segment(city, start, stop, rain_threshold):
+    """Worker task: build, score and compare windows ending at rows [start, stop)"""
+    predictor = _predictor
+    if city not in _city_cache:
+        _city_cache[city] = city_series(predictor, city)
+    city_data, filled_data = _city_cache[city]
+    ends = np.arange(start, stop)
+
+    t0 = time.perf_counter()
+    windows = build_city_windows(predictor, city_data, city, ends)
+    t1 = time.perf_counter()
+    outputs = predictor.decode_outputs(predictor.predict_windows(windows))
+    t2 = time.perf_counter()
+
+    months = city_data['time'].dt.month.to_numpy()[ends]
+    return {
+        'city': city,
+        'months': months,
+        'predicted': outputs,
+        'observed': observed_targets(filled_data, ends, rain_threshold),
+        'featurize_seconds': t1 - t0,
+        'inference_seconds': t2 - t1,
+    }
+
+
+def load_city_rows(data_path):
+    """Rows per city, without loading a model - all the parent process needs to plan"""
+    return pd.read_csv(data_path, usecols=['city'])['city'].value_counts().to_dict()
+
+
+def load_sequence_length(preprocess_path):
+    with open(preprocess_path, 'rb') as f:
+        return pickle.load(f).get('sequence_length', 60)
+
+
+def plan_segments(city_rows, sequence_length, cities, segment_size):
+    """Split every city's scoreable window ends into worker-sized segments"""
+    segments = []
+    for city in cities:
+        n_rows = city_rows[city]
+        first = sequence_length - 1
+        last = n_rows - HORIZON_DAYS - 1
+        for start in range(first, last + 1, segment_size):
+            segments.append((city, start, min(start + segment_size, last + 1)))
+    return segments
+
+
+def error_metrics(predicted, observed):
+    """Error metrics for a set of scored windows"""
+    rain_prob = predicted['rain_probability']
+    rained = observed['rained_next_day']
+    metrics = {
+        'windows': int(len(rain_prob)),
+        'rain_brier': float(np.mean((rain_prob - rained) ** 2)),
+        'rain_accuracy': float(np.mean((rain_prob > RAINY_THRESHOLD) == (rained > 0.5))),
+        'observed_rain_rate': float(rained.mean()),
+    }
+    for head in ['temperature', 'rainfall', 'windspeed']:
+        error = predicted[head] - observed[head]
+        metrics[f'{head}_mae'] = float(np.abs(error).mean())
+        metrics[f'{head}_rmse'] = float(np.sqrt(np.mean(error ** 2)))
+        metrics[f'{head}_bias'] = float(error.mean())
+    return metrics
+
+
+def concat_results(results, mask_fn=None):
+    predicted, observed = {}, {}
+    for result in results:
+        mask = mask_fn(result) if mask_fn else slice(None)
+        for key, values in result['predicted'].items():
+            predicted.setdefault(key, []).append(values[mask])
+        for key, values in result['observed'].items():
+            observed.setdefault(key, []).append(values[mask])
+    return ({k: np.concatenate(v) for k, v in predicted.items()},
+            {k: np.concatenate(v) for k, v in observed.items()})
+
+
+def backtest_model(name, model_path, preprocess_path, args):
+    print(f"\n📦 {name}: {os.path.basename(model_path)} ({args.variant})")
+
+    # The model is only loaded in the workers
+    city_rows = load_city_rows(args.data)
+    available_cities = sorted(city_rows)
+    city_lookup = {city.lower(): city for city in available_cities}
+    cities = ([match_city(c, city_lookup, available_cities) for c in args.cities]
+              if args.cities else available_cities)
+    cities = [c for c in cities if c is not None]
+    segments = plan_segments(city_rows, load_sequence_length(preprocess_path), cities, args.segment_size)
+    print(f"🧮 {len(segments)} segments across {len(cities)} cities on {args.workers} workers")
+
+    start = time.perf_counter()
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker,
+                             initargs=(model_path, preprocess_path, args.data, args.variant, args.threads)) as pool:
+        futures = [pool.submit(score_segment, city, s, e, args.rain_threshold)
+                   for city, s, e in segments]
+        for future in as_completed(futures):
+            results.append(future.result())
+    elapsed = time.perf_counter() - start
+
+    if not results:
+        raise RuntimeError("No windows to score - not enough history per city")
+
+    predicted, observed = concat_results(results)
+    n_windows = len(predicted['rain_probability'])
+
+    per_city = {}
+    for city in cities:
+        city_results = [r for r in results if r['city'] == city]
+        if city_results:
+            per_city[city] = error_metrics(*concat_results(city_results))
+
+    seasons = {}
+    for month in range(1, 13):
+        seasons.setdefault(SriLankaWeatherPredictor.get_sri_lanka_season(month), []).append(month)
+
+    per_season = {}
+    for season, season_months in seasons.items():
+        p, o = concat_results(results, lambda r: np.isin(r['months'], season_months))
+        if len(p['rain_probability']):
+            per_season[season] = error_metrics(p, o)
+
+    featurize = sum(r['featurize_seconds'] for r in results)
+    inference = sum(r['inference_seconds'] for r in results)
+    throughput = {
+        'windows': n_windows,
+        'wall_seconds': round(elapsed, 3),
+        'windows_per_second': round(n_windows / elapsed, 1) if elapsed > 0 else None,
+        'featurize_cpu_seconds': round(featurize, 3),
+        'inference_cpu_seconds': round(inference, 3),
+        'workers': args.workers,
+        'inference_buckets': INFERENCE_BUCKETS,
+    }
+    print(f"⚡ {n_windows} windows in {elapsed:.1f}s ({throughput['windows_per_second']} windows/s)")
+
+    return {
+        'model_path': os.path.relpath(model_path, BASE_DIR),
+        'variant': args.variant,
+        'overall': error_metrics(predicted, observed),
+        'per_city': per_city,
+        'per_season': per_season,
+        'throughput': throughput,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the weather models against historical data")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--variant', default='float32', help="float32, float16 or int8 (see quantize.py)")
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, 'Srilanka_weather.csv'))
+    parser.add_argument('--cities', nargs='+', help="Limit to these cities (default: all)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=1, help="TensorFlow threads per worker")
+    parser.add_argument('--segment-size', type=int, default=2048, help="Windows per worker task")
+    parser.add_argument('--rain-threshold', type=float, default=0.1, help="Observed rain (mm) counted as a rainy day")
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'backtest_report.json'))
+    args = parser.parse_args()
+
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'data_path': args.data,
+        'horizon_days': HORIZON_DAYS,
+        'rain_threshold': args.rain_threshold,
+        'models': {},
+    }
+    for name in args.models:
+        model_path, preprocess_path = MODELS[name]
+        report['models'][name] = backtest_model(name, model_path, preprocess_path, args)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Columnar binary responses for bulk prediction clients.
+
+Clients opt in through the Accept header; JSON stays the default:
+
+    Accept: application/vnd.apache.arrow.stream   (needs pyarrow)
+    Accept: application/x-msgpack                 (needs msgpack)
+
+Both formats carry the same columns. Numeric columns are raw float64 values
+in the units the JSON reports (rain_probability as 0-1, temperature in °C,
+rainfall in mm, windspeed in km/h) and are NaN for rows that failed, whose
+message is in the error column.
+"""
+import numpy as np
+from fastapi import Response
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_ALIASES = (MSGPACK_MEDIA_TYPE, "application/msgpack", "application/vnd.msgpack")
+
+STRING_COLUMNS = ['city', 'date', 'note', 'error']
+FLOAT_COLUMNS = ['rain_probability', 'temperature', 'rainfall', 'windspeed']
+
+
+def available_formats():
+    formats = []
+    if pa is not None:
+        formats.append(ARROW_MEDIA_TYPE)
+    if msgpack is not None:
+        formats.append(MSGPACK_MEDIA_TYPE)
+    return formats
+
+
+def negotiate(accept_header):
+    """Return the binary media type the client asked for, or None for JSON"""
+    if not accept_header:
+        return None
+
+    # Highest q wins; ties go to the type listed first. q=0 means "not acceptable"
+    best_q, best = 0.0, None
+    for part in accept_header.split(','):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        media_type = media_type.lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        if media_type == ARROW_MEDIA_TYPE and pa is not None:
+            choice = ARROW_MEDIA_TYPE
+        elif media_type in MSGPACK_ALIASES and msgpack is not None:
+            choice = MSGPACK_MEDIA_TYPE
+        elif media_type in ('application/json', 'application/*', '*/*'):
+            choice = None
+        else:
+            continue
+        if q > best_q:
+            best_q, best = q, choice
+    return best
+
+
+def to_columns(results):
+    """Turn raw prediction values (and error entries) into columns"""
+    columns = {name: [result.get(name) for result in results] for name in STRING_COLUMNS}
+    for name in FLOAT_COLUMNS:
+        columns[name] = np.array([result.get(name, np.nan) for result in results], dtype=np.float64)
+    return columns
+
+
+def encode_arrow(columns):
+    table = pa.table({
+        **{name: pa.array(columns[name], type=pa.string()) for name in STRING_COLUMNS},
+        **{name: pa.array(columns[name], type=pa.float64()) for name in FLOAT_COLUMNS},
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(columns):
+    # Float columns go out as little-endian float64 buffers: np.frombuffer(buf, '<f8')
+    payload = {
+        'rows': len(columns['city']),
+        'float_dtype': '<f8',
+        'columns': {
+            **{name: columns[name] for name in STRING_COLUMNS},
+            **{name: columns[name].astype('<f8').tobytes() for name in FLOAT_COLUMNS},
+        },
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def bulk_response(results, media_type, headers=None):
+    """Encode raw prediction values in the negotiated binary format"""
+    columns = to_columns(results)
+    body = encode_arrow(columns) if media_type == ARROW_MEDIA_TYPE else encode_msgpack(columns)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def decode_bulk(body, media_type):
+    """Decode a bulk response back into one dict per row (used by router.py to merge shards)"""
+    if media_type == ARROW_MEDIA_TYPE:
+        return pa.ipc.open_stream(body).read_all().to_pylist()
+
+    payload = msgpack.unpackb(body, raw=False)
+    columns = dict(payload['columns'])
+    for name in FLOAT_COLUMNS:
+        columns[name] = np.frombuffer(columns[name], dtype=payload['float_dtype']).tolist()
+    return [{name: columns[name][i] for name in columns} for i in range(payload['rows'])]
@@ -0,0 +1,46 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so a burst of equal requests runs once"""
+
+    def __init__(self):
+        self._calls = {}
+        self.stats = {
+            'leaders': 0,
+            'deduplicated': 0,
+        }
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    async def do(self, key, factory, timeout=None):
+        """Await factory() for key, sharing the pending result with identical callers.
+
+        Each caller has its own timeout. The shared call is only cancelled once
+        every caller waiting on it has gone (timed out or disconnected).
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = {'task': asyncio.ensure_future(factory()), 'waiters': 0}
+            self._calls[key] = call
+            call['task'].add_done_callback(lambda _: self._forget(key, call))
+            self.stats['leaders'] += 1
+        else:
+            self.stats['deduplicated'] += 1
+
+        call['waiters'] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call['task']), timeout)
+        finally:
+            call['waiters'] -= 1
+            if call['waiters'] == 0 and not call['task'].done():
+                call['task'].cancel()
+                self._forget(key, call)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def snapshot(self):
+        return {**self.stats, 'in_flight': len(self._calls)}
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Columns summarised by /history/summary
+SUMMARY_COLUMNS = ['temperature', 'rain', 'windspeed', 'precipitationHcount']
+
+
+class SparseTable:
+    """Range min/max in O(1) after an O(n log n) build; NaNs are ignored"""
+
+    def __init__(self, values, op):
+        self.op = op
+        self.levels = [values]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(op(previous[:-width], previous[width:]))
+            width *= 2
+
+    def query(self, lo, hi):
+        """op over values[lo..hi], both inclusive"""
+        level = (hi - lo + 1).bit_length() - 1
+        table = self.levels[level]
+        return self.op(table[lo], table[hi - (1 << level) + 1])
+
+
+class CityHistory:
+    """Prefix sums and sparse tables over one city's daily series"""
+
+    def __init__(self, city_data):
+        city_data = city_data.sort_values('time')
+        self.dates = city_data['time'].to_numpy().astype('datetime64[D]')
+        self.first_date = self.dates[0]
+        # Gap-free daily series can be indexed by date arithmetic instead of a search
+        self.contiguous = bool(np.all(np.diff(self.dates) == np.timedelta64(1, 'D')))
+
+        self.prefix_sums = {}
+        self.prefix_counts = {}
+        self.minimum = {}
+        self.maximum = {}
+        for column in SUMMARY_COLUMNS:
+            values = city_data[column].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(values)
+            self.prefix_sums[column] = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+            self.prefix_counts[column] = np.concatenate([[0], np.cumsum(valid)])
+            self.minimum[column] = SparseTable(values, np.fmin)
+            self.maximum[column] = SparseTable(values, np.fmax)
+
+    def index_range(self, start, end):
+        """Row positions [lo, hi] covering start..end (inclusive), or None if empty"""
+        if self.contiguous:
+            lo = max(0, int((start - self.first_date).astype(int)))
+            hi = min(len(self.dates) - 1, int((end - self.first_date).astype(int)))
+        else:
+            lo = int(np.searchsorted(self.dates, start, side='left'))
+            hi = int(np.searchsorted(self.dates, end, side='right')) - 1
+        return (lo, hi) if lo <= hi else None
+
+    def summary(self, start, end):
+        """Statistics for start..end (inclusive), given as datetime64[D]"""
+        span = self.index_range(start, end)
+        if span is None:
+            return None
+
+        lo, hi = span
+        stats = {}
+        for column in SUMMARY_COLUMNS:
+            count = int(self.prefix_counts[column][hi + 1] - self.prefix_counts[column][lo])
+            total = float(self.prefix_sums[column][hi + 1] - self.prefix_sums[column][lo])
+            minimum = float(self.minimum[column].query(lo, hi))
+            maximum = float(self.maximum[column].query(lo, hi))
+            stats[column] = {
+                'mean': round(total / count, 4) if count else None,
+                'total': round(total, 4),
+                'min': None if np.isnan(minimum) else minimum,
+                'max': None if np.isnan(maximum) else maximum,
+                'days': count,
+            }
+
+        return {
+            'first_date': str(self.dates[lo]),
+            'last_date': str(self.dates[hi]),
+            'days': hi - lo + 1,
+            'statistics': stats,
+        }
+
+
+class HistoryIndex:
+    """Constant-time historical aggregates for every city, built when data loads"""
+
+    def __init__(self, df):
+        self.cities = {city: CityHistory(city_data) for city, city_data in df.groupby('city')}
+
+    def summary(self, city, start, end):
+        history = self.cities.get(city)
+        if history is None:
+            return None
+        return history.summary(start, end)
@@ -0,0 +1,54 @@
+import hashlib
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents, used as a data/model version"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_etag(*parts):
+    """Weak ETag from the data/model versions and whatever identifies the resource.
+
+    Weak because GZipMiddleware may compress the body without touching the
+    ETag, and a strong validator must differ between content codings.
+    """
+    key = "|".join(str(part) for part in parts)
+    return 'W/"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def _opaque_tag(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def etag_matches(request: Request, etag):
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(_opaque_tag(tag.strip()) == _opaque_tag(etag) for tag in header.split(','))
+
+
+def cache_headers(etag, cache_control, vary=None):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def not_modified(etag, cache_control, vary=None):
+    return Response(status_code=304, headers=cache_headers(etag, cache_control, vary))
+
+
+def cached_json(content, etag, cache_control, vary=None):
+    """JSON response carrying validators for later conditional requests"""
+    return JSONResponse(content=jsonable_encoder(content), headers=cache_headers(etag, cache_control, vary))
@@ -0,0 +1,307 @@
+"""Traffic-replay load generator for the prediction API.
+
+Replays the call patterns the frontend and scripts actually produce, as an
+open-loop Poisson arrival process at a target rate:
+
+    session  GET /cities -> POST /predict -> GET /advice   (risk-predict page)
+    batch    POST /predict/batch with --batch-size items   (analytics scripts)
+
+Against a throwaway local server with the stub model and synthetic data:
+
+    python loadtest.py --spawn --rate 50 --duration 60 --mix session=0.95,batch=0.05
+
+Against a running server, comparing with an earlier report:
+
+    python loadtest.py --url http://127.0.0.1:8000 --compare loadtest_baseline.json
+
+Every run writes a JSON report (config plus per-endpoint throughput,
+p50/p95/p99 latency and error rate) so runs can be compared over time.
+Settings can also come from a JSON profile (--profile) whose keys match
+the command line options.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SYNTHETIC_CITIES = [
+    'Colombo', 'Kandy', 'Galle', 'Jaffna', 'Matara', 'Negombo',
+    'Anuradhapura', 'Trincomalee', 'Batticaloa', 'Ratnapura', 'Badulla', 'Kurunegala'
+]
+
+
+class Recorder:
+    """Per-endpoint latency and status bookkeeping"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.failures = {}
+
+    def record(self, name, seconds, status):
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+        bucket = self.statuses.setdefault(name, {})
+        bucket[str(status)] = bucket.get(str(status), 0) + 1
+
+    def fail(self, name, seconds, error):
+        self.record(name, seconds, type(error).__name__)
+        self.failures.setdefault(name, 0)
+        self.failures[name] += 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for name, latencies in sorted(self.latencies.items()):
+            values = np.array(latencies)
+            statuses = self.statuses[name]
+            ok = sum(count for status, count in statuses.items() if status in ('200', '304'))
+            endpoints[name] = {
+                'requests': len(values),
+                'throughput_per_s': round(len(values) / duration, 2),
+                'error_rate': round(1 - ok / len(values), 4),
+                'p50_ms': round(float(np.percentile(values, 50)), 2),
+                'p95_ms': round(float(np.percentile(values, 95)), 2),
+                'p99_ms': round(float(np.percentile(values, 99)), 2),
+                'max_ms': round(float(values.max()), 2),
+                'statuses': statuses,
+            }
+        return endpoints
+
+
+async def timed(recorder, name, call):
+    start = time.perf_counter()
+    try:
+        response = await call
+    except httpx.HTTPError as e:
+        recorder.fail(name, time.perf_counter() - start, e)
+        return None
+    recorder.record(name, time.perf_counter() - start, response.status_code)
+    return response
+
+
+def random_date(rng, start, end):
+    return (start + timedelta(days=rng.randrange((end - start).days + 1))).strftime('%Y-%m-%d')
+
+
+async def session_scenario(client, recorder, rng, args):
+    """One visit to the risk-predict page"""
+    headers = {'X-Forwarded-For': f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"}
+    response = await timed(recorder, 'GET /cities', client.get('/cities', headers=headers))
+    if response is None or response.status_code != 200:
+        return
+    cities = response.json()['available_cities']
+
+    city = rng.choice(cities)
+    date = random_date(rng, args.date_start, args.date_end)
+    await timed(recorder, 'POST /predict', client.post('/predict', json={'city': city, 'date': date}, headers=headers))
+    await timed(recorder, 'GET /advice', client.get('/advice', params={'city': city, 'date': date}, headers=headers))
+
+
+async def batch_scenario(client, recorder, rng, args, cities):
+    """One bulk job from an analytics script"""
+    headers = {'X-Forwarded-For': f"172.16.{rng.randrange(256)}.{rng.randrange(1, 255)}"}
+    items = [{'city': rng.choice(cities), 'date': random_date(rng, args.date_start, args.date_end)}
+             for _ in range(args.batch_size)]
+    await timed(recorder, 'POST /predict/batch', client.post('/predict/batch', json=items, headers=headers))
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {'session', 'batch'}
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+async def run_load(args):
+    """Open-loop arrivals: scenarios start on schedule whether or not earlier ones finished"""
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        cities = (await client.get('/cities')).json()['available_cities']
+
+        tasks = set()
+        dropped = 0
+        start = time.perf_counter()
+        next_arrival = start
+        while next_arrival - start < args.duration:
+            await asyncio.sleep(max(0, next_arrival - time.perf_counter()))
+            if len(tasks) >= args.max_in_flight:
+                dropped += 1
+            else:
+                scenario = rng.choices(names, weights)[0]
+                if scenario == 'session':
+                    coro = session_scenario(client, recorder, rng, args)
+                else:
+                    coro = batch_scenario(client, recorder, rng, args, cities)
+                task = asyncio.create_task(coro)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_arrival += rng.expovariate(args.rate)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - start
+
+        metrics = None
+        try:
+            metrics = (await client.get('/metrics')).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    return {
+        'duration_s': round(elapsed, 2),
+        'scenarios_dropped_client_side': dropped,
+        'endpoints': recorder.summary(elapsed),
+        'server_metrics': metrics,
+    }
+
+
+def write_synthetic_data(path, cities, days, seed):
+    """Plausible daily weather for a few cities, enough for the stub server"""
+    rng = np.random.default_rng(seed)
+    dates = np.array([datetime(2020, 1, 1) + timedelta(days=i) for i in range(days)])
+    doy = np.array([d.timetuple().tm_yday for d in dates])
+    with open(path, 'w') as f:
+        f.write('time,city,temperature,rain,windspeed,precipitationHcount\n')
+        for city in cities:
+            temperature = 27 + 3 * np.sin(2 * np.pi * doy / 365) + rng.normal(0, 1, days)
+            rain = np.clip(rng.gamma(0.6, 8, days) * (rng.random(days) < 0.45), 0, 100)
+            windspeed = 12 + 4 * np.cos(2 * np.pi * doy / 365) + rng.normal(0, 2, days)
+            hours = np.minimum(24, (rain > 0) * rng.integers(1, 12, days))
+            for i in range(days):
+                f.write(f"{dates[i]:%Y-%m-%d},{city},{temperature[i]:.2f},{rain[i]:.2f},{windspeed[i]:.2f},{hours[i]}\n")
+
+
+def spawn_server(args):
+    """Start app.py with the stub model on synthetic data and wait until it is healthy"""
+    data_path = os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'synthetic_weather.csv')
+    write_synthetic_data(data_path, SYNTHETIC_CITIES[:args.cities], args.days, args.seed)
+
+    env = {
+        **os.environ,
+        'MODEL_VARIANT': 'stub',
+        'STUB_LATENCY_MS': str(args.stub_latency_ms),
+        'DATA_PATH': data_path,
+        # Virtual sessions carry their own client address
+        'TRUST_FORWARDED_FOR': '1',
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(args.port),
+         '--log-level', 'warning'],
+        env=env, cwd=BASE_DIR
+    )
+    args.url = f"http://127.0.0.1:{args.port}"
+
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Stub server exited during startup")
+        try:
+            if httpx.get(f"{args.url}/health", timeout=2).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("Stub server did not become healthy within 120s")
+
+
+def compare(report, baseline_path, threshold):
+    """Print per-endpoint deltas against a baseline report; return True on regression"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']['endpoints']
+
+    regressed = False
+    print(f"\n📊 Compared with {baseline_path}")
+    for name, current in report['results']['endpoints'].items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"   {name:22s} (new)")
+            continue
+        p99_change = (current['p99_ms'] - before['p99_ms']) / before['p99_ms'] if before['p99_ms'] else 0
+        flag = ""
+        if p99_change > threshold or current['error_rate'] > before['error_rate'] + 0.01:
+            flag = "❌ regression"
+            regressed = True
+        print(f"   {name:22s} p95 {before['p95_ms']:8.1f} -> {current['p95_ms']:8.1f} ms  "
+              f"p99 {before['p99_ms']:8.1f} -> {current['p99_ms']:8.1f} ms  "
+              f"errors {before['error_rate']:.2%} -> {current['error_rate']:.2%}  {flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay frontend-like traffic against the prediction API")
+    parser.add_argument('--profile', help="JSON file with option values (command line wins)")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn', action='store_true', help="Start a local stub-model server on synthetic data")
+    parser.add_argument('--port', type=int, default=8765, help="Port for --spawn")
+    parser.add_argument('--stub-latency-ms', type=float, default=5, help="Per-call stub model latency for --spawn")
+    parser.add_argument('--cities', type=int, default=8, help="Synthetic cities for --spawn")
+    parser.add_argument('--days', type=int, default=3 * 365, help="Synthetic days of data for --spawn")
+    parser.add_argument('--rate', type=float, default=20, help="Scenario arrivals per second")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of arrivals")
+    parser.add_argument('--mix', default='session=0.95,batch=0.05', help="Scenario weights")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--date-start', default='2021-01-01')
+    parser.add_argument('--date-end', default='2022-12-31')
+    parser.add_argument('--max-in-flight', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'loadtest_report.json'))
+    parser.add_argument('--compare', help="Baseline report to compare against")
+    parser.add_argument('--fail-on-regression', type=float, default=0.2,
+                        help="Exit non-zero when p99 grows by more than this fraction")
+
+    args = parser.parse_args()
+    if args.profile:
+        with open(args.profile) as f:
+            parser.set_defaults(**json.load(f))
+        args = parser.parse_args()
+
+    args.date_start = datetime.strptime(args.date_start, '%Y-%m-%d')
+    args.date_end = datetime.strptime(args.date_end, '%Y-%m-%d')
+
+    process = spawn_server(args) if args.spawn else None
+    try:
+        print(f"🚦 {args.rate}/s for {args.duration}s against {args.url} ({args.mix})")
+        results = asyncio.run(run_load(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    config = {k: (v.strftime('%Y-%m-%d') if isinstance(v, datetime) else v) for k, v in vars(args).items()}
+    report = {'generated_at': datetime.now().isoformat(), 'config': config, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, stats in results['endpoints'].items():
+        print(f"   {name:22s} {stats['requests']:6d} req  {stats['throughput_per_s']:7.1f}/s  "
+              f"p50 {stats['p50_ms']:7.1f}  p95 {stats['p95_ms']:7.1f}  p99 {stats['p99_ms']:7.1f} ms  "
+              f"errors {stats['error_rate']:.2%}")
+    print(f"📝 Report written to {args.output}")
+
+    if args.compare and compare(report, args.compare, args.fail_on_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
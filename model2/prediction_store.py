@@ -0,0 +1,230 @@
+"""Persistent prediction store shared by every worker process and across restarts.
+
+A SQLite database in WAL mode, so any number of uvicorn workers can read
+concurrently while one writes. Entries are keyed by canonical city, date,
+model hash and data snapshot hash, so a new model or data file never serves
+stale values. The store is bounded: once it grows past max_rows the least
+recently used entries are evicted.
+
+Enable it in the API with PREDICTION_STORE=/var/lib/weather/predictions.sqlite,
+and prefill it after a deploy so hit rates are high from the first request:
+
+    python prediction_store.py prefill --store predictions.sqlite --start 2023-01-01 --end 2023-12-31
+    python prediction_store.py import --store predictions.sqlite precomputed.jsonl
+    python prediction_store.py stats --store predictions.sqlite
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Don't rewrite an entry's access time more often than this on reads
+TOUCH_INTERVAL_SECONDS = 60
+# Check the size bound every this many writes
+EVICT_CHECK_EVERY = 500
+
+
+class PredictionStore:
+    def __init__(self, path, max_rows=500_000):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes_since_check = 0
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                key TEXT PRIMARY KEY,
+                city TEXT NOT NULL,
+                date TEXT NOT NULL,
+                model_hash TEXT NOT NULL,
+                data_hash TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)")
+        connection.commit()
+
+    def _connection(self):
+        """One connection per thread; SQLite connections can't be shared between threads"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(city, date, model_hash, data_hash):
+        return f"{city}|{date}|{model_hash}|{data_hash}"
+
+    def get(self, city, date, model_hash, data_hash):
+        """Stored prediction values, or None"""
+        key = self.make_key(city, date, model_hash, data_hash)
+        connection = self._connection()
+        row = connection.execute("SELECT payload, accessed FROM predictions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL_SECONDS:
+            try:
+                connection.execute("UPDATE predictions SET accessed = ? WHERE key = ?", (now, key))
+                connection.commit()
+            except sqlite3.OperationalError:
+                # Another worker holds the write lock - the access time can wait
+                pass
+        return json.loads(row[0])
+
+    def put(self, city, date, model_hash, data_hash, values):
+        self.put_many([(city, date, model_hash, data_hash, values)])
+
+    def put_many(self, entries):
+        """Store (city, date, model_hash, data_hash, values) tuples in one transaction"""
+        now = time.time()
+        rows = [(self.make_key(city, date, model_hash, data_hash), city, date, model_hash, data_hash,
+                 json.dumps(values), now)
+                for city, date, model_hash, data_hash, values in entries]
+        if not rows:
+            return
+
+        connection = self._connection()
+        try:
+            connection.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.commit()
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Prediction store write skipped: {e}")
+            connection.rollback()
+            return
+        self.stats['writes'] += len(rows)
+
+        self._writes_since_check += len(rows)
+        if self._writes_since_check >= EVICT_CHECK_EVERY:
+            self._writes_since_check = 0
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries down to 90% of max_rows"""
+        if self.max_rows <= 0:
+            return
+        connection = self._connection()
+        try:
+            count = connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if count <= self.max_rows:
+                return
+
+            excess = count - int(self.max_rows * 0.9)
+            connection.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY accessed LIMIT ?)",
+                (excess,)
+            )
+            connection.commit()
+        except sqlite3.OperationalError as e:
+            # Another worker holds the lock - the next write will try again
+            print(f"⚠️ Prediction store eviction skipped: {e}")
+            connection.rollback()
+            return
+        self.stats['evicted'] += excess
+
+    def snapshot(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None,
+            'max_rows': self.max_rows,
+        }
+
+
+def prefill(args):
+    """Compute predictions for every city and date in a range and store them"""
+    import pandas as pd
+    from app import SriLankaWeatherPredictor
+
+    store = PredictionStore(args.store, args.max_rows)
+    predictor = SriLankaWeatherPredictor(data_path=args.data)
+    cities = [predictor.find_city_match(c) for c in args.cities] if args.cities else predictor.available_cities
+    dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(args.start, args.end, freq='D')]
+    pairs = [(city, date) for city in cities if city for date in dates]
+
+    start = time.perf_counter()
+    stored = 0
+    for offset in range(0, len(pairs), args.chunk_size):
+        chunk = pairs[offset:offset + args.chunk_size]
+        results = predictor.predict_values_many(chunk)
+        entries = [(result['city'], result['date'], predictor.model_version, predictor.data_version, result)
+                   for result in results if 'error' not in result]
+        store.put_many(entries)
+        stored += len(entries)
+        print(f"💾 {stored}/{len(pairs)} stored ({time.perf_counter() - start:.1f}s)")
+    store.evict()
+
+
+def import_jsonl(args):
+    """Load precomputed rows: {"city", "date", "model_hash", "data_hash", "values"} per line"""
+    store = PredictionStore(args.store, args.max_rows)
+    batch, total = [], 0
+    with open(args.path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            # Keys use the canonical YYYY-MM-DD date the API looks up with
+            date = datetime.strptime(row['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
+            batch.append((row['city'], date, row['model_hash'], row['data_hash'], row['values']))
+            if len(batch) >= args.chunk_size:
+                store.put_many(batch)
+                total += len(batch)
+                batch = []
+    store.put_many(batch)
+    total += len(batch)
+    store.evict()
+    print(f"💾 Imported {total} predictions into {args.store}")
+
+
+def show_stats(args):
+    connection = sqlite3.connect(args.store)
+    count = connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    versions = connection.execute(
+        "SELECT model_hash, data_hash, COUNT(*) FROM predictions GROUP BY model_hash, data_hash"
+    ).fetchall()
+    print(f"📦 {count} predictions in {args.store}")
+    for model_hash, data_hash, rows in versions:
+        print(f"   model {model_hash} / data {data_hash}: {rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the persistent prediction store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prefill_parser = subparsers.add_parser('prefill', help="Compute and store predictions for a date range")
+    prefill_parser.add_argument('--start', required=True)
+    prefill_parser.add_argument('--end', required=True)
+    prefill_parser.add_argument('--cities', nargs='+')
+    prefill_parser.add_argument('--data', default='Srilanka_weather.csv')
+    prefill_parser.set_defaults(func=prefill)
+
+    import_parser = subparsers.add_parser('import', help="Import precomputed predictions from JSON lines")
+    import_parser.add_argument('path')
+    import_parser.set_defaults(func=import_jsonl)
+
+    stats_parser = subparsers.add_parser('stats', help="Show what the store holds")
+    stats_parser.set_defaults(func=show_stats)
+
+    for sub in (prefill_parser, import_parser, stats_parser):
+        sub.add_argument('--store', default='predictions.sqlite')
+        sub.add_argument('--max-rows', type=int, default=500_000)
+        sub.add_argument('--chunk-size', type=int, default=128)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Create reduced-precision variants of the weather models and report on them.
+
+For each model this writes float16 and dynamic-range int8 TFLite variants next
+to the original .h5 file, then scores all variants on a held-out slice of the
+data (the most recent days of every city) and compares latency, memory and
+output drift of the four heads against the original float32 model.
+
+    python quantize.py                      # both models
+    python quantize.py --models model2      # PSO model only
+    python quantize.py --report-only        # re-run the report on existing variants
+
+Serve a variant with MODEL_VARIANT=float16 or MODEL_VARIANT=int8, but only once
+the report marks it as within tolerance.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import tensorflow as tf
+
+from app import SriLankaWeatherPredictor
+from weather_common.model_variants import VARIANTS, load_weather_model, variant_paths  # app adds the repo root to sys.path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODELS = {
+    'model1': (os.path.join(BASE_DIR, '..', 'model1', 'srilanka_weather_model.h5'),
+               os.path.join(BASE_DIR, '..', 'model1', 'preprocessing_objects.pkl')),
+    'model2': (os.path.join(BASE_DIR, 'srilanka_weather_pso_model.h5'),
+               os.path.join(BASE_DIR, 'preprocessing_objects.pkl')),
+}
+
+HEADS = ['rain_probability', 'temperature', 'rainfall', 'windspeed']
+
+# Maximum absolute drift per head, in served units (probability, °C, mm/day, km/h)
+DEFAULT_TOLERANCE = {
+    'rain_probability': 0.02,
+    'temperature': 0.2,
+    'rainfall': 0.5,
+    'windspeed': 0.2,
+}
+
+
+def convert_model(model, variant):
+    """Convert a Keras model to a TFLite flatbuffer for the given variant"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    # Fall back to TF ops for anything the LSTM layers can't lower to builtins
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    return converter.convert()
+
+
+def write_variant(model, model_path, variant):
+    """Convert and save a variant together with its signature metadata"""
+    tflite_path, meta_path = variant_paths(model_path, variant)
+    flatbuffer = convert_model(model, variant)
+    with open(tflite_path, 'wb') as f:
+        f.write(flatbuffer)
+
+    interpreter = tf.lite.Interpreter(model_content=flatbuffer)
+    signature = interpreter.get_signature_list()['serving_default']
+
+    # Keep the Keras head order so predict() output matches the original model.
+    # Guessing the order from the signature could silently swap heads
+    output_names = list(model.output_names)
+    missing = sorted(set(output_names) - set(signature['outputs']))
+    if missing:
+        raise ValueError(f"TFLite signature outputs {sorted(signature['outputs'])} don't include "
+                         f"Keras heads {missing}; can't map the head order for {os.path.basename(model_path)}")
+
+    meta = {
+        'variant': variant,
+        'source_model': os.path.basename(model_path),
+        'input_name': signature['inputs'][0],
+        'output_names': output_names,
+        'created_at': datetime.now().isoformat(),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"✅ Wrote {os.path.basename(tflite_path)} ({len(flatbuffer) / 1024:.1f} KiB)")
+    return tflite_path
+
+
+def holdout_windows(predictor, holdout_days, stride):
+    """Build scaled input windows for the most recent days of every city"""
+    windows = []
+    for city in predictor.available_cities:
+        city_dates = predictor.df.loc[predictor.df['city'] == city, 'time'].sort_values()
+        for date in city_dates.tail(holdout_days).iloc[::stride]:
+            window, _, error = predictor.build_window(city, date.strftime('%Y-%m-%d'))
+            if error is None:
+                windows.append(window)
+
+    if not windows:
+        raise RuntimeError("No held-out windows could be built from the data")
+    return np.stack(windows)
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 when unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def measure_latency(model, windows, runs, batch_size):
+    """Single-row latency percentiles and batched throughput"""
+    # Warm up once so graph building is not counted
+    model.predict(windows[:1], verbose=0)
+
+    timings = []
+    for i in range(runs):
+        row = windows[i % len(windows)][np.newaxis]
+        start = time.perf_counter()
+        model.predict(row, verbose=0)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    outputs = [[] for _ in HEADS]
+    for offset in range(0, len(windows), batch_size):
+        predictions = model.predict(windows[offset:offset + batch_size], verbose=0)
+        for head, values in zip(outputs, predictions):
+            head.append(np.asarray(values).reshape(-1))
+    elapsed = time.perf_counter() - start
+
+    latency = {
+        'single_p50_ms': float(np.percentile(timings, 50)),
+        'single_p95_ms': float(np.percentile(timings, 95)),
+        'single_p99_ms': float(np.percentile(timings, 99)),
+        'batch_size': batch_size,
+        'batch_throughput_per_s': float(len(windows) / elapsed) if elapsed > 0 else None,
+    }
+    return latency, [np.concatenate(head) for head in outputs]
+
+
+def drift_metrics(reference, candidate, tolerance):
+    """Per-head drift of a variant against the float32 reference"""
+    drift = {}
+    for head in HEADS:
+        diff = np.abs(candidate[head] - reference[head])
+        drift[head] = {
+            'mean_abs': float(diff.mean()),
+            'p99_abs': float(np.percentile(diff, 99)),
+            'max_abs': float(diff.max()),
+            'tolerance': tolerance[head],
+            'within_tolerance': bool(diff.max() <= tolerance[head]),
+        }
+
+    # A flipped Rainy / Not Rainy call is what users actually notice
+    drift['rain_probability']['decision_flip_rate'] = float(np.mean(
+        (candidate['rain_probability'] > 0.65) != (reference['rain_probability'] > 0.65)
+    ))
+    return drift
+
+
+def report_model(name, model_path, preprocess_path, data_path, args, tolerance):
+    """Convert one model (unless report-only) and compare every variant"""
+    print(f"\n📦 {name}: {os.path.basename(model_path)}")
+    predictor = SriLankaWeatherPredictor(model_path, preprocess_path, data_path, model_variant='float32')
+
+    if not args.report_only:
+        for variant in VARIANTS[1:]:
+            write_variant(predictor.model, model_path, variant)
+
+    windows = holdout_windows(predictor, args.holdout_days, args.stride)
+    print(f"🧪 Scoring {len(windows)} held-out windows")
+
+    results = {}
+    reference = None
+    for variant in VARIANTS:
+        # Load every variant the same way the app does so memory is comparable
+        before = current_rss()
+        model = load_weather_model(model_path, variant)
+        rss_delta = current_rss() - before
+        size = os.path.getsize(model_path if variant == 'float32' else variant_paths(model_path, variant)[0])
+
+        latency, raw = measure_latency(model, windows, args.latency_runs, args.batch_size)
+        outputs = predictor.decode_outputs(raw)
+
+        entry = {
+            'file_size_bytes': size,
+            'rss_delta_bytes': rss_delta,
+            'latency': latency,
+        }
+        if reference is None:
+            reference = outputs
+        else:
+            entry['drift'] = drift_metrics(reference, outputs, tolerance)
+            entry['within_tolerance'] = all(d['within_tolerance'] for d in entry['drift'].values())
+        results[variant] = entry
+
+        status = ""
+        if 'within_tolerance' in entry:
+            status = "✅ within tolerance" if entry['within_tolerance'] else "❌ drift above tolerance"
+        print(f"   {variant:8s} {size / 1024:8.1f} KiB  p50 {latency['single_p50_ms']:7.2f} ms  "
+              f"{latency['batch_throughput_per_s'] or 0:9.1f} windows/s  {status}")
+
+    return {
+        'model_path': os.path.relpath(model_path, BASE_DIR),
+        'held_out_windows': int(len(windows)),
+        'variants': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the weather models and report accuracy/speed")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, 'Srilanka_weather.csv'))
+    parser.add_argument('--report-only', action='store_true', help="Skip conversion, report on existing variants")
+    parser.add_argument('--holdout-days', type=int, default=90, help="Most recent days per city to score")
+    parser.add_argument('--stride', type=int, default=1, help="Use every n-th held-out day")
+    parser.add_argument('--latency-runs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=128)
+    for head in HEADS:
+        parser.add_argument(f"--tol-{head.replace('_', '-')}", type=float, default=DEFAULT_TOLERANCE[head],
+                            help=f"Max absolute drift allowed for {head}")
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'quantization_report.json'))
+    args = parser.parse_args()
+
+    tolerance = {head: getattr(args, f"tol_{head}") for head in HEADS}
+
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'tensorflow_version': tf.__version__,
+        'holdout_days': args.holdout_days,
+        'tolerance': tolerance,
+        'models': {},
+    }
+    for name in args.models:
+        model_path, preprocess_path = MODELS[name]
+        report['models'][name] = report_model(name, model_path, preprocess_path, args.data, args, tolerance)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Routing front end for a city-sharded deployment.
+
+Each shard is a normal app.py process started with SHARD_INDEX/SHARD_COUNT
+(or SHARD_CITIES) so it only loads its own cities. The router learns which
+shard owns which city from each shard's /cities, resolves the requested city
+the same way the predictor does, and forwards the request to the owner.
+Mixed-city batches are split per shard, sent in parallel and merged back in
+the original order.
+
+Try it on one machine (three shards on ports 8101-8103, router on 8000):
+
+    python router.py --shards 3
+
+or point the router at shards started elsewhere:
+
+    SHARD_URLS=http://10.0.0.5:8000,http://10.0.0.6:8000 python -m uvicorn router:app
+
+Remote shards must run with TRUST_FORWARDED_FOR=1 (and only accept traffic
+from the router), otherwise every request looks like it comes from the
+router and all clients share one rate limit. The router warns at startup
+about shards whose /health says they don't trust it.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+
+from bulk_format import bulk_response, decode_bulk, negotiate
+from http_cache import cached_json, etag_matches, make_etag, not_modified
+
+SHARD_URLS = [url.strip().rstrip('/') for url in os.getenv('SHARD_URLS', '').split(',') if url.strip()]
+ROUTER_TIMEOUT = float(os.getenv('ROUTER_TIMEOUT', '60'))
+ROUTER_STARTUP_WAIT = float(os.getenv('ROUTER_STARTUP_WAIT', '180'))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1000'))
+CACHE_CONTROL = f"public, max-age={int(os.getenv('CACHE_MAX_AGE', '300'))}"
+
+# Request headers passed to shards, and response headers passed back
+FORWARD_HEADERS = ('accept', 'if-none-match', 'x-latency-budget-ms')
+RETURN_HEADERS = ('etag', 'cache-control', 'vary', 'retry-after')
+
+app = FastAPI(
+    title="Sri Lanka Weather Prediction Router",
+    description="Routes prediction requests to city-sharded Sri Lanka Weather Prediction API processes",
+    version="2.0.0"
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag"],
+)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+client = None
+city_to_shard = {}
+city_lookup = {}
+available_cities = []
+
+
+async def load_city_map():
+    """Ask every shard which cities it owns, waiting for shards that are still starting"""
+    global available_cities, city_lookup
+
+    deadline = time.monotonic() + ROUTER_STARTUP_WAIT
+    for shard in SHARD_URLS:
+        while True:
+            try:
+                response = await client.get(f"{shard}/cities")
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as e:
+                if time.monotonic() > deadline:
+                    print(f"❌ Shard {shard} unavailable: {e}")
+                    response = None
+                    break
+                await asyncio.sleep(1)
+
+        if response is None:
+            continue
+        for city in response.json()['available_cities']:
+            city_to_shard[city] = shard
+        print(f"🧩 {shard}: {response.json()['total_cities']} cities")
+        await check_forwarded_trust(shard)
+
+    available_cities = sorted(city_to_shard)
+    city_lookup = {city.lower(): city for city in available_cities}
+
+
+async def check_forwarded_trust(shard):
+    """Warn when a shard keys its limits on the router's address instead of the client's"""
+    try:
+        response = await client.get(f"{shard}/health")
+        trusted = response.json().get('trust_forwarded_for')
+    except (httpx.HTTPError, ValueError):
+        return
+    if trusted is False:
+        print(f"⚠️ {shard} runs without TRUST_FORWARDED_FOR=1 - all clients behind the router "
+              f"will share one rate limit and concurrency budget on that shard")
+
+
+def resolve_city(input_city):
+    """Same rules as SriLankaWeatherPredictor.find_city_match, over every shard's cities"""
+    input_city_lower = input_city.lower().strip()
+    if input_city_lower in city_lookup:
+        return city_lookup[input_city_lower]
+    for city in available_cities:
+        if input_city_lower in city.lower():
+            return city
+    return None
+
+
+def city_not_found(city):
+    return f"City '{city}' not found. Try: {', '.join(available_cities[:8])}"
+
+
+def forward_headers(request: Request):
+    headers = {name: request.headers[name] for name in FORWARD_HEADERS if name in request.headers}
+    client_host = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get('x-forwarded-for')
+    headers['x-forwarded-for'] = f"{forwarded}, {client_host}" if forwarded else client_host
+    return headers
+
+
+def relay(response):
+    """Pass a shard response back to the caller unchanged"""
+    headers = {name: response.headers[name] for name in RETURN_HEADERS if name in response.headers}
+    return Response(content=response.content, status_code=response.status_code,
+                    media_type=response.headers.get('content-type'), headers=headers)
+
+
+async def shard_request(shard, method, path, request: Request, **kwargs):
+    try:
+        return await client.request(method, f"{shard}{path}", headers=forward_headers(request), **kwargs)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Shard {shard} unavailable: {e}")
+
+
+def owner(city):
+    actual_city = resolve_city(city) if city else None
+    if actual_city is None:
+        raise HTTPException(status_code=400, detail=city_not_found(city))
+    return actual_city, city_to_shard[actual_city]
+
+
+def merged_rows(responses, media_type):
+    """Rows from a list of successful shard bulk responses"""
+    rows = []
+    for response in responses:
+        if media_type:
+            rows.append(decode_bulk(response.content, media_type))
+        else:
+            rows.append(response.json()['predictions'])
+    return rows
+
+
+def bulk_reply(rows, media_type):
+    if media_type:
+        return bulk_response(rows, media_type, headers={"Vary": "Accept"})
+    return JSONResponse(content={"predictions": rows, "total_predictions": len(rows)},
+                        headers={"Vary": "Accept"})
+
+
+@app.on_event("startup")
+async def startup_event():
+    global client
+    client = httpx.AsyncClient(timeout=ROUTER_TIMEOUT)
+    if not SHARD_URLS:
+        print("❌ SHARD_URLS is empty - nothing to route to")
+        return
+    await load_city_map()
+    print(f"🚀 Router ready: {len(available_cities)} cities on {len(SHARD_URLS)} shards")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await client.aclose()
+
+
+@app.get("/")
+async def root():
+    return {
+        "message": "🌤️ Sri Lanka Weather Prediction API (sharded)",
+        "status": "✅ Running",
+        "available_cities": len(available_cities),
+        "shards": SHARD_URLS
+    }
+
+
+@app.get("/health")
+async def health_check(request: Request):
+    async def shard_health(shard):
+        try:
+            response = await client.get(f"{shard}/health")
+            return shard, response.json() if response.status_code == 200 else {"status": response.status_code}
+        except httpx.HTTPError as e:
+            return shard, {"status": "unreachable", "error": str(e)}
+
+    shards = dict(await asyncio.gather(*(shard_health(shard) for shard in SHARD_URLS)))
+    healthy = all(s.get("status") == "healthy" for s in shards.values())
+    return JSONResponse(status_code=200 if healthy else 503, content={
+        "status": "healthy" if healthy else "degraded",
+        "shards": shards
+    })
+
+
+@app.get("/cities")
+async def get_cities(request: Request):
+    etag = make_etag("cities", *available_cities)
+    if etag_matches(request, etag):
+        return not_modified(etag, CACHE_CONTROL)
+    return cached_json({
+        "available_cities": available_cities,
+        "total_cities": len(available_cities)
+    }, etag, CACHE_CONTROL)
+
+
+@app.post("/predict")
+async def predict_weather(request: Request):
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    actual_city, shard = owner(body.get('city', ''))
+    response = await shard_request(shard, "POST", "/predict", request, json={**body, 'city': actual_city})
+    return relay(response)
+
+
+@app.get("/predict")
+async def get_prediction(city: str, request: Request):
+    actual_city, shard = owner(city)
+    params = {**request.query_params, 'city': actual_city}
+    return relay(await shard_request(shard, "GET", "/predict", request, params=params))
+
+
+@app.get("/advice")
+async def get_farming_advice(city: str, request: Request):
+    actual_city, shard = owner(city)
+    params = {**request.query_params, 'city': actual_city}
+    return relay(await shard_request(shard, "GET", "/advice", request, params=params))
+
+
+@app.post("/predict/batch")
+async def predict_weather_batch(request: Request):
+    items = await request.json()
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON list of predictions")
+    if MAX_BATCH_SIZE > 0 and len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Maximum is {MAX_BATCH_SIZE} predictions")
+
+    # Split by owning shard, remembering each item's position
+    results = [None] * len(items)
+    groups = {}
+    for i, item in enumerate(items):
+        city = item.get('city', '') if isinstance(item, dict) else ''
+        actual_city = resolve_city(city) if city else None
+        if actual_city is None:
+            results[i] = {'city': city, 'date': item.get('date') if isinstance(item, dict) else None,
+                          'error': city_not_found(city)}
+            continue
+        positions, sub_batch = groups.setdefault(city_to_shard[actual_city], ([], []))
+        positions.append(i)
+        sub_batch.append({**item, 'city': actual_city})
+
+    shards = list(groups)
+    responses = await asyncio.gather(*(
+        shard_request(shard, "POST", "/predict/batch", request, json=groups[shard][1]) for shard in shards
+    ))
+    for response in responses:
+        if response.status_code != 200:
+            return relay(response)
+
+    media_type = negotiate(request.headers.get('accept'))
+    for shard, rows in zip(shards, merged_rows(responses, media_type)):
+        for position, row in zip(groups[shard][0], rows):
+            results[position] = row
+
+    return bulk_reply(results, media_type)
+
+
+@app.get("/predict/all-cities")
+async def predict_all_cities(request: Request):
+    responses = await asyncio.gather(*(
+        shard_request(shard, "GET", "/predict/all-cities", request) for shard in SHARD_URLS
+    ))
+    for response in responses:
+        if response.status_code != 200:
+            return relay(response)
+
+    media_type = negotiate(request.headers.get('accept'))
+    rows = [row for shard_rows in merged_rows(responses, media_type) for row in shard_rows]
+    rows.sort(key=lambda row: row['city'])
+    return bulk_reply(rows, media_type)
+
+
+@app.get("/history/summary")
+async def get_history_summary(city: str, request: Request):
+    actual_city, shard = owner(city)
+    params = {**request.query_params, 'city': actual_city}
+    return relay(await shard_request(shard, "GET", "/history/summary", request, params=params))
+
+
+@app.post("/history/summary/batch")
+async def get_history_summary_batch(request: Request):
+    items = await request.json()
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON list of queries")
+    if MAX_BATCH_SIZE > 0 and len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Maximum is {MAX_BATCH_SIZE} queries")
+
+    results = [None] * len(items)
+    groups = {}
+    for i, item in enumerate(items):
+        city = item.get('city', '') if isinstance(item, dict) else ''
+        actual_city = resolve_city(city) if city else None
+        if actual_city is None:
+            results[i] = {'city': city, 'error': city_not_found(city)}
+            continue
+        positions, sub_batch = groups.setdefault(city_to_shard[actual_city], ([], []))
+        positions.append(i)
+        sub_batch.append({**item, 'city': actual_city})
+
+    shards = list(groups)
+    responses = await asyncio.gather(*(
+        shard_request(shard, "POST", "/history/summary/batch", request, json=groups[shard][1]) for shard in shards
+    ))
+    for response in responses:
+        if response.status_code != 200:
+            return relay(response)
+
+    for shard, response in zip(shards, responses):
+        for position, row in zip(groups[shard][0], response.json()['summaries']):
+            results[position] = row
+
+    return {"summaries": results, "total_summaries": len(results)}
+
+
+@app.get("/model-info")
+async def get_model_info(request: Request):
+    return relay(await shard_request(SHARD_URLS[0], "GET", "/model-info", request))
+
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    responses = await asyncio.gather(*(
+        shard_request(shard, "GET", "/metrics", request) for shard in SHARD_URLS
+    ))
+    return {shard: response.json() for shard, response in zip(SHARD_URLS, responses)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run city shards and the routing front end locally")
+    parser.add_argument('--shards', type=int, default=2, help="Shard processes to start (0 = use SHARD_URLS)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000, help="Router port")
+    parser.add_argument('--base-port', type=int, default=8101, help="First shard port")
+    args = parser.parse_args()
+
+    processes = []
+    if args.shards > 0:
+        urls = []
+        for index in range(args.shards):
+            port = args.base_port + index
+            env = {**os.environ, 'SHARD_INDEX': str(index), 'SHARD_COUNT': str(args.shards),
+                   'TRUST_FORWARDED_FOR': '1'}
+            processes.append(subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'app:app', '--host', args.host, '--port', str(port)],
+                env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+            ))
+            urls.append(f"http://{args.host}:{port}")
+        SHARD_URLS[:] = urls
+
+    import uvicorn
+    try:
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import zlib
+
+import pandas as pd
+
+
+def shard_of(city, shard_count):
+    """Stable shard index for a city (same on every process and restart)"""
+    return zlib.crc32(city.strip().lower().encode('utf-8')) % shard_count
+
+
+class ShardConfig:
+    """Which cities this process owns, from SHARD_CITIES or SHARD_INDEX/SHARD_COUNT"""
+
+    def __init__(self, cities=None, index=0, count=1):
+        self.cities = {c.strip().lower() for c in cities} if cities else None
+        self.index = index
+        self.count = max(1, count)
+
+    @classmethod
+    def from_env(cls):
+        cities = os.getenv('SHARD_CITIES')
+        return cls(
+            cities=[c for c in cities.split(',') if c.strip()] if cities else None,
+            index=int(os.getenv('SHARD_INDEX', '0')),
+            count=int(os.getenv('SHARD_COUNT', '1')),
+        )
+
+    @property
+    def enabled(self):
+        return self.cities is not None or self.count > 1
+
+    def owns(self, city):
+        if self.cities is not None:
+            return city.strip().lower() in self.cities
+        return shard_of(city, self.count) == self.index
+
+    def describe(self):
+        if self.cities is not None:
+            return {"mode": "cities", "cities": sorted(self.cities)}
+        return {"mode": "hash", "index": self.index, "count": self.count}
+
+
+def read_shard_csv(data_path, shard, chunksize=200_000):
+    """Read the weather CSV keeping only this shard's cities, one chunk at a time"""
+    if not shard.enabled:
+        return pd.read_csv(data_path)
+
+    chunks = []
+    owned = {}
+    for chunk in pd.read_csv(data_path, chunksize=chunksize):
+        for city in chunk['city'].unique():
+            if city not in owned:
+                owned[city] = shard.owns(city)
+        chunks.append(chunk[chunk['city'].map(owned)])
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1 @@
+"""Code shared by the model1 and model2 APIs"""
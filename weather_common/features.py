@@ -0,0 +1,8 @@
+# Feature order used by model1, whose preprocessing objects have no feature_names
+LEGACY_FEATURE_COLUMNS = [
+    'temperature', 'rain', 'windspeed', 'precipitationHcount',
+    'month', 'day_of_year', 'city_encoded',
+    'temp_roll_7', 'temp_roll_14', 'temp_roll_30',
+    'rain_roll_7', 'rain_roll_14', 'rain_roll_30',
+    'wind_roll_7', 'wind_roll_14', 'wind_roll_30'
+]
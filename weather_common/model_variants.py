@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+# Supported model variants. "float32" is the original Keras .h5 model, the
+# others are TFLite conversions written next to it by quantize.py
+VARIANTS = ("float32", "float16", "int8")
+
+
+def variant_paths(model_path, variant):
+    """Return the (tflite_path, metadata_path) pair for a reduced-precision variant"""
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}_{variant}.tflite", f"{stem}_{variant}.json"
+
+
+# Batch sizes that get a dedicated interpreter; any others share one that is resized per call
+MAX_TFLITE_INTERPRETERS = 8
+
+
+class TFLiteWeatherModel:
+    """TFLite-backed model with the same predict() contract as the Keras model.
+
+    A signature runner resizes its input and re-allocates tensors whenever the
+    batch size changes, so each batch size (the inference buckets, in practice)
+    gets its own interpreter and keeps its allocation between calls.
+    """
+
+    def __init__(self, tflite_path, meta_path, num_threads=None):
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+
+        self.tflite_path = tflite_path
+        self.num_threads = num_threads
+        self.input_name = self.meta['input_name']
+        self.output_names = self.meta['output_names']
+        self.variant = self.meta.get('variant')
+
+        # batch size -> (signature runner, lock); interpreters are not thread-safe
+        self._runners = {}
+        self._shared = self._make_runner()
+        self._runners_lock = threading.Lock()
+
+    def _make_runner(self):
+        interpreter = tf.lite.Interpreter(model_path=self.tflite_path, num_threads=self.num_threads)
+        return interpreter.get_signature_runner(), threading.Lock()
+
+    def _runner_for(self, batch_size):
+        with self._runners_lock:
+            runner = self._runners.get(batch_size)
+            if runner is None:
+                if len(self._runners) >= MAX_TFLITE_INTERPRETERS:
+                    return self._shared
+                runner = self._runners[batch_size] = self._make_runner()
+            return runner
+
+    def predict(self, x, verbose=0):
+        """Return the four heads as a list, in the Keras output order"""
+        x = np.asarray(x, dtype=np.float32)
+        runner, lock = self._runner_for(len(x))
+        with lock:
+            outputs = runner(**{self.input_name: x})
+        return [np.asarray(outputs[name]) for name in self.output_names]
+
+
+class StubWeatherModel:
+    """Deterministic stand-in for the LSTM, used for load testing (MODEL_VARIANT=stub)"""
+
+    def __init__(self, latency_ms=0.0, per_row_ms=0.0):
+        self.latency_ms = latency_ms
+        self.per_row_ms = per_row_ms
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        time.sleep((self.latency_ms + self.per_row_ms * n) / 1000)
+
+        # Outputs depend on the input so different cities/dates give different answers
+        signal = x.mean(axis=(1, 2)).reshape(n, 1)
+        rain_prob = 1 / (1 + np.exp(-signal))
+        return [rain_prob, np.full((n, 1), 0.5) + signal / 10, np.full((n, 1), 0.3), np.full((n, 1), 0.4)]
+
+
+def load_weather_model(model_path, variant=None):
+    """Load the original Keras model or one of its reduced-precision variants"""
+    variant = variant or "float32"
+    if variant == "stub":
+        return StubWeatherModel(float(os.getenv('STUB_LATENCY_MS', '5')),
+                                float(os.getenv('STUB_PER_ROW_MS', '0.05')))
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}'. Use one of: {', '.join(VARIANTS)}")
+
+    if variant == "float32":
+        return tf.keras.models.load_model(model_path, compile=False)
+
+    tflite_path, meta_path = variant_paths(model_path, variant)
+    if not os.path.exists(tflite_path):
+        raise FileNotFoundError(f"{tflite_path} not found. Run quantize.py to create it")
+    return TFLiteWeatherModel(tflite_path, meta_path)